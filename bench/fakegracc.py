@@ -0,0 +1,931 @@
+#!/usr/bin/env python3
+"""Offline stand-in for GRACC, for benchmarking the metric tools.
+
+Serves the parts of the OpenSearch search API that the tools use
+(term/terms/range/match/wildcard queries; terms, composite, filters,
+date_histogram and date_range bucket aggregations; sum, cardinality,
+extended_stats and percentiles metrics, on fields or simple scripts;
+sorting with search_after, and scroll)
+over an in-memory set of documents in three indices:
+
+    gracc.osg.summary       daily per-user Payload and per-facility Batch usage
+    gracc.osg.raw-synthetic individual Payload jobs behind the summary records
+    xrd-stash-synthetic     OSDF transfer records under /ospool
+
+The documents are either generated synthetically (see Dataset) or loaded
+from a JSON lines file of recorded hits.  The Topology rgsummary XML of the
+synthetic facilities is served at /rgsummary/xml.
+
+Point the tools at it with
+
+    GRACC_URL=http://127.0.0.1:PORT
+    TOPOLOGY_RGSUMMARY_URL=http://127.0.0.1:PORT/rgsummary/xml
+
+"""
+
+import argparse
+import calendar
+import collections
+import datetime
+import fnmatch
+import functools
+import hashlib
+import http.server
+import itertools
+import json
+import random
+import re
+import sys
+import threading
+import time
+import urllib.parse
+import uuid
+from xml.sax.saxutils import escape
+
+
+DATE_FIELDS = ("StartTime", "EndTime", "QueueTime", "@timestamp")
+
+SUMMARY_INDEX = "gracc.osg.summary"
+RAW_INDEX = "gracc.osg.raw-synthetic"
+STASH_INDEX = "xrd-stash-synthetic"
+
+ACCESS_POINTS = [
+    "condor-ap:login04.osgconnect.net",
+    "condor-ap:login05.osgconnect.net",
+    "condor-ap:ap20.uc.osg-htc.org",
+    "condor-ap:ap21.uc.osg-htc.org",
+    "condor-ap:ap40.uw.osg-htc.org",
+]
+
+BATCH_VOS = ["hcc", "glow", "suragrid", "osg", "cms", "atlas"]
+
+_epoch = datetime.datetime(1970, 1, 1)
+DAY_MS = 86400 * 1000
+
+
+class UnsupportedRequest(Exception):
+    """The request uses a part of the search API the stand-in does not have"""
+
+
+# -- dates
+
+
+@functools.lru_cache(maxsize=4096)
+def to_ms(value):
+    """Epoch milliseconds of an epoch-ms number or an ISO date(time) string"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = value.rstrip("Z")
+    if "T" not in text and " " not in text:
+        text += "T00:00:00"
+    dt = datetime.datetime.fromisoformat(text)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return int((dt - _epoch).total_seconds() * 1000)
+
+
+def ms_to_iso(ms):
+    dt = _epoch + datetime.timedelta(milliseconds=ms)
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.") + "%03dZ" % (ms % 1000)
+
+
+def _month_floor(ms):
+    dt = _epoch + datetime.timedelta(milliseconds=ms)
+    return to_ms(dt.strftime("%Y-%m-01"))
+
+
+def _next_month(ms):
+    dt = _epoch + datetime.timedelta(milliseconds=ms)
+    days = calendar.monthrange(dt.year, dt.month)[1]
+    return _month_floor(ms) + days * DAY_MS
+
+
+def _interval(spec):
+    """(floor, next) functions for a date_histogram calendar interval"""
+    if spec in ("1d", "day"):
+        return (lambda ms: ms - ms % DAY_MS), (lambda ms: ms + DAY_MS)
+    if spec in ("1M", "month"):
+        return _month_floor, _next_month
+    raise UnsupportedRequest("calendar_interval %r" % spec)
+
+
+# -- queries
+
+
+def _field(field):
+    # dirname1.keyword and the like are the exact values of dirname1
+    return field[:-len(".keyword")] if field.endswith(".keyword") else field
+
+
+def _list(clauses):
+    if clauses is None:
+        return []
+    return [clauses] if isinstance(clauses, dict) else list(clauses)
+
+
+def _single(body, kind):
+    if not isinstance(body, dict) or len(body) != 1:
+        raise UnsupportedRequest("%s query %r" % (kind, body))
+    (field, value), = body.items()
+    return _field(field), value
+
+
+def _comparable(field, value):
+    return to_ms(value) if field in DATE_FIELDS else value
+
+
+def matches(query, doc):
+    """Whether doc matches the query DSL dict"""
+    if not query:
+        return True
+    (kind, body), = query.items()
+    if kind == "match_all":
+        return True
+    if kind == "bool":
+        must = _list(body.get("must")) + _list(body.get("filter"))
+        should = _list(body.get("should"))
+        must_not = _list(body.get("must_not"))
+        if not all(matches(q, doc) for q in must):
+            return False
+        if any(matches(q, doc) for q in must_not):
+            return False
+        if should:
+            need = body.get("minimum_should_match", 0 if must else 1)
+            return sum(matches(q, doc) for q in should) >= need
+        return True
+    if kind in ("term", "match"):
+        field, value = _single(body, kind)
+        if isinstance(value, dict):
+            value = value.get("value", value.get("query"))
+        return doc.get(field) == _comparable(field, value)
+    if kind == "terms":
+        field, values = _single(body, kind)
+        return doc.get(field) in set(_comparable(field, v) for v in values)
+    if kind == "range":
+        field, bounds = _single(body, kind)
+        value = doc.get(field)
+        if value is None:
+            return False
+        for op, bound in bounds.items():
+            if op in ("format", "time_zone"):
+                continue
+            bound = _comparable(field, bound)
+            if ((op == "gte" and not value >= bound)
+                    or (op == "gt" and not value > bound)
+                    or (op == "lte" and not value <= bound)
+                    or (op == "lt" and not value < bound)):
+                return False
+        return True
+    if kind == "wildcard":
+        field, pattern = _single(body, kind)
+        if isinstance(pattern, dict):
+            pattern = pattern["value"]
+        value = doc.get(field)
+        return isinstance(value, str) and fnmatch.fnmatchcase(value, pattern)
+    if kind == "exists":
+        return doc.get(_field(body["field"])) is not None
+    raise UnsupportedRequest("%s query" % kind)
+
+
+def _conjuncts(query):
+    """The term queries every match of query must satisfy"""
+    if not query:
+        return
+    (kind, body), = query.items()
+    if kind == "term":
+        field, value = _single(body, kind)
+        if isinstance(value, dict):
+            value = value.get("value")
+        yield field, value
+    elif kind == "bool" and not body.get("should"):
+        for q in _list(body.get("must")) + _list(body.get("filter")):
+            yield from _conjuncts(q)
+
+
+# -- aggregations
+
+
+def _sub_aggs(spec):
+    return spec.get("aggs", spec.get("aggregations", {}))
+
+
+def _bucket(docs, spec, **fields):
+    bucket = dict(fields, doc_count=len(docs))
+    bucket.update(aggregate(_sub_aggs(spec), docs))
+    return bucket
+
+
+def aggregate(aggs, docs):
+    """The aggregations response for the aggregations dict over docs"""
+    result = {}
+    for name, spec in aggs.items():
+        kinds = [k for k in spec if k not in ("aggs", "aggregations", "meta")]
+        if len(kinds) != 1:
+            raise UnsupportedRequest("aggregation %r" % spec)
+        kind = kinds[0]
+        body = spec[kind]
+        agg = _AGGREGATIONS.get(kind)
+        if agg is None:
+            raise UnsupportedRequest("%s aggregation" % kind)
+        result[name] = agg(body, spec, docs)
+    return result
+
+
+_script_rules = [
+    (re.compile(r"doc\['([^']+)'\]\.size\(\)"), r"(0 if d.get('\1') is None else 1)"),
+    (re.compile(r"doc\['([^']+)'\]\.value\.toInstant\(\)\.toEpochMilli\(\)"), r"d.get('\1')"),
+    (re.compile(r"doc\['([^']+)'\]\.value"), r"d.get('\1')"),
+    (re.compile(r"&&"), " and "),
+    (re.compile(r"\|\|"), " or "),
+    (re.compile(r"!(?!=)"), " not "),
+]
+
+
+@functools.lru_cache(maxsize=64)
+def _compile_script(source):
+    """A function of a document for a Painless expression that only reads
+    doc['field'].value (dates as .toInstant().toEpochMilli()) and
+    doc['field'].size(), with arithmetic, comparisons and at most one
+    top-level ?: conditional"""
+    expr = source.strip().rstrip(";")
+    if expr.startswith("return "):
+        expr = expr[len("return "):]
+    for pattern, replacement in _script_rules:
+        expr = pattern.sub(replacement, expr)
+    if "?" in expr:
+        cond, _, rest = expr.partition("?")
+        then, colon, otherwise = rest.partition(":")
+        if not colon:
+            raise UnsupportedRequest("script %r" % source)
+        expr = "(%s) if (%s) else (%s)" % (then, cond, otherwise)
+    try:
+        code = compile(expr, "<script>", "eval")
+    except SyntaxError:
+        raise UnsupportedRequest("script %r" % source)
+    return lambda d: eval(code, {"__builtins__": {}}, {"d": d})
+
+
+def _values(body, docs):
+    missing = body.get("missing")
+    if "script" in body:
+        script = body["script"]
+        get = _compile_script(script if isinstance(script, str) else script["source"])
+    else:
+        field = _field(body["field"])
+        get = lambda doc: doc.get(field, missing)
+    for doc in docs:
+        value = get(doc)
+        if value is not None:
+            yield value
+
+
+def _agg_sum(body, spec, docs):
+    return {"value": float(sum(_values(body, docs)))}
+
+
+def _agg_max(body, spec, docs):
+    return {"value": max(_values(body, docs), default=None)}
+
+
+def _agg_min(body, spec, docs):
+    return {"value": min(_values(body, docs), default=None)}
+
+
+def _agg_cardinality(body, spec, docs):
+    return {"value": len(set(_values(body, docs)))}
+
+
+def _agg_value_count(body, spec, docs):
+    return {"value": sum(1 for _ in _values(body, docs))}
+
+
+def _agg_extended_stats(body, spec, docs):
+    values = list(_values(body, docs))
+    n = len(values)
+    total = float(sum(values))
+    squares = float(sum(v * v for v in values))
+    mean = total / n if n else None
+    variance = squares / n - mean * mean if n else None
+    return {"count": n, "sum": total, "min": min(values, default=None),
+            "max": max(values, default=None), "avg": mean,
+            "sum_of_squares": squares, "variance": variance,
+            "std_deviation": max(variance, 0) ** 0.5 if n else None}
+
+
+def _agg_percentiles(body, spec, docs):
+    values = sorted(_values(body, docs))
+    result = {}
+    for p in body.get("percents", [1, 5, 25, 50, 75, 95, 99]):
+        if not values:
+            result[str(float(p))] = None
+            continue
+        # linear interpolation between the closest ranks
+        rank = p / 100 * (len(values) - 1)
+        lo = int(rank)
+        hi = min(lo + 1, len(values) - 1)
+        result[str(float(p))] = values[lo] + (values[hi] - values[lo]) * (rank - lo)
+    return {"values": result}
+
+
+def _agg_composite(body, spec, docs):
+    sources = []
+    for source in body["sources"]:
+        (name, definition), = source.items()
+        (kind, params), = definition.items()
+        field = _field(params["field"])
+        if kind == "terms":
+            key = lambda doc, field=field: doc.get(field)
+        elif kind == "date_histogram":
+            floor, _ = _interval(params.get("calendar_interval", params.get("interval")))
+            key = lambda doc, field=field, floor=floor: \
+                None if doc.get(field) is None else floor(doc[field])
+        else:
+            raise UnsupportedRequest("%s composite source" % kind)
+        sources.append((name, key))
+
+    groups = collections.defaultdict(list)
+    for doc in docs:
+        key = tuple(get(doc) for _, get in sources)
+        if None not in key:
+            groups[key].append(doc)
+    keys = sorted(groups)
+    after = body.get("after")
+    if after is not None:
+        after = tuple(after[name] for name, _ in sources)
+        keys = [k for k in keys if k > after]
+    keys = keys[:body.get("size", 10)]
+    names = [name for name, _ in sources]
+    result = {"buckets": [_bucket(groups[k], spec, key=dict(zip(names, k)))
+                          for k in keys]}
+    if keys:
+        result["after_key"] = dict(zip(names, keys[-1]))
+    return result
+
+
+def _agg_terms(body, spec, docs):
+    field = _field(body["field"])
+    groups = collections.defaultdict(list)
+    for doc in docs:
+        value = doc.get(field, body.get("missing"))
+        if value is not None:
+            groups[value].append(doc)
+    keys = sorted(groups, key=lambda k: (-len(groups[k]), k))
+    size = body.get("size", 10)
+    shown = keys[:size]
+    return {
+        "doc_count_error_upper_bound": 0,
+        "sum_other_doc_count": sum(len(groups[k]) for k in keys[size:]),
+        "buckets": [_bucket(groups[k], spec, key=k) for k in shown],
+    }
+
+
+def _agg_filters(body, spec, docs):
+    filters = body["filters"]
+    if isinstance(filters, dict):
+        return {"buckets": {
+            name: _bucket([d for d in docs if matches(q, d)], spec)
+            for name, q in filters.items()}}
+    return {"buckets": [_bucket([d for d in docs if matches(q, d)], spec)
+                        for q in filters]}
+
+
+def _agg_filter(body, spec, docs):
+    return _bucket([d for d in docs if matches(body, d)], spec)
+
+
+def _agg_date_range(body, spec, docs):
+    field = _field(body["field"])
+    buckets = []
+    for r in body["ranges"]:
+        lo = to_ms(r["from"]) if r.get("from") is not None else None
+        hi = to_ms(r["to"]) if r.get("to") is not None else None
+        inside = [d for d in docs if d.get(field) is not None
+                  and (lo is None or d[field] >= lo) and (hi is None or d[field] < hi)]
+        key = r.get("key", "%s-%s" % (ms_to_iso(lo) if lo is not None else "*",
+                                      ms_to_iso(hi) if hi is not None else "*"))
+        buckets.append(_bucket(inside, spec, key=key, **{
+            name: value for name, value in (("from", lo), ("to", hi))
+            if value is not None}))
+    if body.get("keyed"):
+        return {"buckets": {b.pop("key"): b for b in buckets}}
+    return {"buckets": buckets}
+
+
+def _agg_date_histogram(body, spec, docs):
+    field = _field(body["field"])
+    floor, step = _interval(body.get("calendar_interval", body.get("interval")))
+    groups = collections.defaultdict(list)
+    for doc in docs:
+        value = doc.get(field)
+        if value is not None:
+            groups[floor(value)].append(doc)
+    keys = set(groups)
+    min_doc_count = body.get("min_doc_count", 0)
+    if min_doc_count == 0:
+        bounds = body.get("extended_bounds", {})
+        ends = list(keys) + [floor(to_ms(v)) for v in bounds.values()]
+        if ends:
+            key, last = min(ends), max(ends)
+            while key <= last:
+                keys.add(key)
+                key = step(key)
+    return {"buckets": [
+        _bucket(groups.get(k, []), spec, key=k, key_as_string=ms_to_iso(k))
+        for k in sorted(keys) if len(groups.get(k, [])) >= min_doc_count]}
+
+
+_AGGREGATIONS = {
+    "sum": _agg_sum,
+    "max": _agg_max,
+    "min": _agg_min,
+    "cardinality": _agg_cardinality,
+    "value_count": _agg_value_count,
+    "terms": _agg_terms,
+    "filters": _agg_filters,
+    "filter": _agg_filter,
+    "date_histogram": _agg_date_histogram,
+    "date_range": _agg_date_range,
+    "composite": _agg_composite,
+    "extended_stats": _agg_extended_stats,
+    "percentiles": _agg_percentiles,
+}
+
+
+# -- sorting and hits
+
+
+def _sort_spec(sort):
+    spec = []
+    for item in sort or []:
+        if isinstance(item, str):
+            spec.append((item, item == "_score" and "desc" or "asc"))
+        else:
+            (field, order), = item.items()
+            if isinstance(order, dict):
+                order = order.get("order", "asc")
+            spec.append((field, order))
+    return spec
+
+
+def _sort_values(doc, spec):
+    return [doc.get(field) for field, _ in spec]
+
+
+def _compare(a, b, spec):
+    for x, y, (_, order) in zip(a, b, spec):
+        if x == y:
+            continue
+        # missing values sort last either way
+        if x is None:
+            return 1
+        if y is None:
+            return -1
+        c = -1 if x < y else 1
+        return -c if order == "desc" else c
+    return 0
+
+
+def _source(doc, includes):
+    shown = {k: v for k, v in doc.items() if k not in ("_id", "_index")}
+    if includes is not None:
+        shown = {k: v for k, v in shown.items() if k in includes}
+    return {k: ms_to_iso(v) if k in DATE_FIELDS and v is not None else v
+            for k, v in shown.items()}
+
+
+def _hit(doc, includes, spec):
+    hit = {"_index": doc["_index"], "_id": doc["_id"], "_score": None}
+    if includes is not False:
+        hit["_source"] = _source(doc, includes)
+    if spec:
+        hit["sort"] = _sort_values(doc, spec)
+    return hit
+
+
+# -- the data
+
+
+class Dataset:
+    """Documents by index, with a lazily built term index for lookups"""
+
+    def __init__(self, docs=(), topology_xml=""):
+        self.indices = collections.defaultdict(list)
+        for doc in docs:
+            self.indices[doc["_index"]].append(doc)
+        self.topology_xml = topology_xml
+        self._postings = {}
+        self._lock = threading.Lock()
+
+    def add(self, index, doc_id, source):
+        doc = {k: to_ms(v) if k in DATE_FIELDS and v is not None else v
+               for k, v in source.items()}
+        doc["_index"] = index
+        doc["_id"] = doc_id
+        self.indices[index].append(doc)
+
+    def resolve(self, pattern):
+        """Names of the indices matching a comma-separated index pattern"""
+        names = []
+        for part in pattern.split(","):
+            names += [n for n in sorted(self.indices)
+                      if fnmatch.fnmatchcase(n, part)]
+        return names
+
+    def _posting(self, index, field):
+        with self._lock:
+            key = (index, field)
+            if key not in self._postings:
+                posting = collections.defaultdict(list)
+                for doc in self.indices[index]:
+                    posting[doc.get(field)].append(doc)
+                self._postings[key] = posting
+            return self._postings[key]
+
+    def candidates(self, index, query):
+        """The documents of index that might match query: those with the
+        rarest of the terms it requires"""
+        found = self.indices[index]
+        for field, value in _conjuncts(query):
+            docs = self._posting(index, field).get(_comparable(field, value), [])
+            if len(docs) < len(found):
+                found = docs
+        return found
+
+    def search(self, pattern, query):
+        docs = []
+        for index in self.resolve(pattern):
+            docs += [d for d in self.candidates(index, query)
+                     if matches(query, d)]
+        return docs
+
+    def dump(self, f):
+        """Write the documents as JSON lines of recorded hits"""
+        for index, docs in sorted(self.indices.items()):
+            for doc in docs:
+                f.write(json.dumps({"_index": index, "_id": doc["_id"],
+                                    "_source": _source(doc, None)}) + "\n")
+
+    @classmethod
+    def load(cls, f, topology_xml=""):
+        """Read documents from JSON lines of recorded hits"""
+        dataset = cls(topology_xml=topology_xml)
+        for line in f:
+            if line.strip():
+                hit = json.loads(line)
+                dataset.add(hit["_index"], hit["_id"], hit["_source"])
+        return dataset
+
+
+class Facility:
+    def __init__(self, i, rng):
+        self.name = "Facility %d" % i
+        self.site = "Site %d" % i if i else "AMNH"
+        self.resource = "RESOURCE_%d_CE" % i
+        self.fqdn = "ce%d.facility%d.example.edu" % (i, i)
+        self.organization = "Organization %d" % (i % 40)
+        self.ccstar = rng.random() < 0.3 or i == 0
+        self.osdf = rng.random() < 0.2
+
+
+def synthetic(users=50, days=30, records=20, seed=1, end=None):
+    """Generate a Dataset of `days` days up to (not including) `end` (default
+    today, UTC) with `users` users running about `records` jobs on each of
+    the days they are active"""
+    rng = random.Random(seed)
+    if end is None:
+        end = datetime.datetime.utcnow().date()
+    first = end - datetime.timedelta(days=days)
+    dataset = Dataset()
+    ids = itertools.count()
+
+    facilities = [Facility(i, rng) for i in range(max(5, users // 10))]
+    dataset.topology_xml = topology_xml(facilities)
+
+    for day in (first + datetime.timedelta(days=i) for i in range(days)):
+        midday = datetime.datetime.combine(day, datetime.time(12))
+        for f in facilities:
+            for vo in BATCH_VOS:
+                if rng.random() < 0.5:
+                    dataset.add(SUMMARY_INDEX, "s%d" % next(ids), {
+                        "ResourceType": "Batch", "VOName": vo,
+                        "ReportableVOName": vo, "EndTime": midday.isoformat(),
+                        "CoreHours": rng.uniform(0, 500), "GPUs": 0,
+                        "OIM_Facility": f.name, "OIM_Site": f.site,
+                        "OIM_FQDN": f.fqdn, "OIM_Resource": f.resource,
+                        "OIM_Organization": f.organization,
+                    })
+
+    for u in range(users):
+        dn = "/OU=LocalUser/CN=user%d" % u
+        project = "Project%d" % (u % max(1, users // 3))
+        probe = rng.choice(ACCESS_POINTS)
+        # users start at some point in the range and are idle on some days;
+        # some stop for a few weeks and then come back
+        start = rng.randrange(days)
+        idle = rng.uniform(0, 0.6)
+        away = set()
+        if rng.random() < 0.3:
+            leave = rng.randrange(start, days)
+            away = set(range(leave, leave + rng.randint(15, 25)))
+        for d in range(start, days):
+            if d in away or rng.random() < idle:
+                continue
+            day = first + datetime.timedelta(days=d)
+            daystart = datetime.datetime.combine(day, datetime.time())
+            f = rng.choice(facilities)
+            gpus = 1 if rng.random() < 0.1 else 0
+            corehours = 0.0
+            by_end = collections.Counter()
+            for _ in range(max(1, int(rng.gauss(records, records / 4)))):
+                started = daystart + datetime.timedelta(seconds=rng.uniform(0, 86400))
+                wall = rng.expovariate(1 / 7200)
+                queued = started - datetime.timedelta(seconds=rng.expovariate(1 / 1800))
+                ended = started + datetime.timedelta(seconds=wall)
+                cores = rng.choice((1, 1, 1, 2, 4, 8))
+                dataset.add(RAW_INDEX, uuid.UUID(int=rng.getrandbits(128)).hex, {
+                    "ResourceType": "Payload", "VOName": "osg", "DN": dn,
+                    "ProjectName": project, "ProbeName": probe,
+                    "RecordId": "%s:%d.0" % (probe.split(":")[-1], next(ids)),
+                    "StartTime": started.isoformat(), "EndTime": ended.isoformat(),
+                    "QueueTime": queued.isoformat(), "WallDuration": wall,
+                    "CoreHours": wall * cores / 3600, "Processors": cores,
+                })
+                by_end[ended.date()] += wall * cores / 3600
+            # the summary records are per day of EndTime
+            for endday, hours in sorted(by_end.items()):
+                dataset.add(SUMMARY_INDEX, "s%d" % next(ids), {
+                    "ResourceType": "Payload", "VOName": "osg",
+                    "ReportableVOName": "osg", "DN": dn,
+                    "ProjectName": project, "ProbeName": probe,
+                    "EndTime": datetime.datetime.combine(endday, datetime.time(12)).isoformat(),
+                    "CoreHours": hours, "GPUs": gpus,
+                    "OIM_Facility": f.name, "OIM_Site": f.site,
+                    "OIM_FQDN": f.fqdn, "OIM_Resource": f.resource,
+                    "OIM_Organization": f.organization,
+                })
+
+    # OSDF transfers for the months up to the last day, a few per active
+    # user-month, plus monitoring transfers that the tools leave out
+    months = set()
+    day = end - datetime.timedelta(days=1)
+    for i in range(7):
+        months.add((day.year, day.month))
+        day = day.replace(day=1) - datetime.timedelta(days=1)
+    for u in range(users):
+        ap = rng.choice(("ap20.uc.osg-htc.org", "ap40.uw.osg-htc.org"))
+        for year, month in sorted(months):
+            if rng.random() < 0.5:
+                continue
+            for _ in range(rng.randint(1, 3)):
+                when = datetime.datetime(year, month, rng.randint(1, 28), 12)
+                dataset.add(STASH_INDEX, "x%d" % next(ids), {
+                    "@timestamp": when.isoformat(), "dirname1": "/ospool",
+                    "dirname2": "/ospool/%s" % ap,
+                    "logical_dirname": "/ospool/%s/data/user%d" % (ap, u),
+                })
+    for year, month in sorted(months):
+        dataset.add(STASH_INDEX, "x%d" % next(ids), {
+            "@timestamp": datetime.datetime(year, month, 15).isoformat(),
+            "dirname1": "/ospool", "dirname2": "/ospool/monitoring",
+            "logical_dirname": "/ospool/monitoring/probe",
+        })
+    return dataset
+
+
+def topology_xml(facilities):
+    """rgsummary XML with one resource group (and CE) per facility"""
+    out = ["<ResourceSummary>"]
+    for f in facilities:
+        services = ["CE"] + (["XRootD cache server"] if f.osdf else [])
+        out += [
+            "<ResourceGroup>",
+            "<GroupName>%s</GroupName>" % escape(f.name + " Group"),
+            "<Facility><Name>%s</Name></Facility>" % escape(f.name),
+            "<Site><Name>%s</Name></Site>" % escape(f.site),
+            "<GridType>OSG Production Resource</GridType>",
+            "<Resources><Resource>",
+            "<Name>%s</Name>" % escape(f.resource),
+            "<Active>True</Active><Disable>False</Disable>",
+            "<FQDN>%s</FQDN>" % escape(f.fqdn),
+            "<Services>%s</Services>" % "".join(
+                "<Service><Name>%s</Name></Service>" % escape(s) for s in services),
+            "<Tags>%s</Tags>" % ("<Tag>CC*</Tag>" if f.ccstar else ""),
+            "</Resource></Resources>",
+            "</ResourceGroup>",
+        ]
+    out.append("</ResourceSummary>")
+    return "\n".join(out)
+
+
+# -- the server
+
+
+class FakeGRACC(http.server.ThreadingHTTPServer):
+    """HTTP server answering searches from a Dataset"""
+
+    daemon_threads = True
+
+    def __init__(self, dataset, address=("127.0.0.1", 0)):
+        super().__init__(address, _Handler)
+        self.dataset = dataset
+        self.scrolls = {}
+        self.requests = 0
+
+    @property
+    def url(self):
+        return "http://%s:%d" % self.server_address[:2]
+
+    def start(self):
+        """Serve from a background thread"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+    def search(self, pattern, body, params):
+        t0 = time.time()
+        query = body.get("query", {})
+        docs = self.dataset.search(pattern, query)
+
+        spec = _sort_spec(body.get("sort"))
+        if spec:
+            docs.sort(key=functools.cmp_to_key(
+                lambda a, b: _compare(_sort_values(a, spec),
+                                      _sort_values(b, spec), spec)))
+        after = body.get("search_after")
+        if after is not None:
+            docs = [d for d in docs
+                    if _compare(_sort_values(d, spec), after, spec) > 0]
+
+        size = int(params.get("size", body.get("size", 10)))
+        start = int(params.get("from", body.get("from", 0)))
+        includes = body.get("_source")
+        if isinstance(includes, dict):
+            includes = includes.get("includes")
+        if isinstance(includes, str):
+            includes = [includes]
+
+        resp = {"timed_out": False,
+                "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0}}
+        hits = {"max_score": None}
+        if body.get("track_total_hits", True) is not False:
+            hits["total"] = {"value": len(docs), "relation": "eq"}
+        page = docs[start:start + size]
+        hits["hits"] = [_hit(d, includes, spec) for d in page]
+        resp["hits"] = hits
+        if "scroll" in params:
+            scroll_id = uuid.uuid4().hex
+            self.scrolls[scroll_id] = (docs[start + size:], size, includes, spec)
+            resp["_scroll_id"] = scroll_id
+        if body.get("aggs") or body.get("aggregations"):
+            resp["aggregations"] = aggregate(_sub_aggs(body), docs)
+        resp["took"] = int((time.time() - t0) * 1000)
+        return resp
+
+    def scroll(self, scroll_id):
+        t0 = time.time()
+        if scroll_id not in self.scrolls:
+            raise KeyError(scroll_id)
+        docs, size, includes, spec = self.scrolls[scroll_id]
+        self.scrolls[scroll_id] = (docs[size:], size, includes, spec)
+        return {"_scroll_id": scroll_id, "timed_out": False,
+                "hits": {"total": {"value": len(docs), "relation": "eq"},
+                         "max_score": None,
+                         "hits": [_hit(d, includes, spec) for d in docs[:size]]},
+                "took": int((time.time() - t0) * 1000)}
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body, content_type="application/json", headers=()):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _error(self, status, kind, reason):
+        self._reply(status, {"error": {"type": kind, "reason": reason},
+                             "status": status})
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        data = self.rfile.read(length) if length else b""
+        return json.loads(data) if data.strip() else {}
+
+    def _route(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        parts = [p for p in url.path.split("/") if p]
+        return parts, params
+
+    def do_HEAD(self):
+        self._reply(200, b"")
+
+    def do_GET(self):
+        parts, params = self._route()
+        if parts == ["rgsummary", "xml"]:
+            xml = self.server.dataset.topology_xml.encode("utf-8")
+            etag = '"%s"' % hashlib.sha1(xml).hexdigest()
+            if self.headers.get("If-None-Match") == etag:
+                self._reply(304, b"", headers=[("ETag", etag)])
+            else:
+                self._reply(200, xml, "application/xml", [("ETag", etag)])
+        elif not parts:
+            self._reply(200, {"name": "fakegracc", "cluster_name": "fakegracc",
+                              "version": {"number": "2.11.0",
+                                          "distribution": "opensearch"}})
+        else:
+            self.do_POST()
+
+    def do_POST(self):
+        parts, params = self._route()
+        self.server.requests += 1
+        try:
+            body = self._body()
+            if parts[-1:] == ["_search"] and len(parts) <= 2:
+                pattern = parts[0] if len(parts) == 2 else "*"
+                self._reply(200, self.server.search(pattern, body, params))
+            elif parts == ["_search", "scroll"]:
+                scroll_id = body.get("scroll_id", params.get("scroll_id"))
+                self._reply(200, self.server.scroll(scroll_id))
+            else:
+                self._error(404, "not_found", "no handler for %s" % self.path)
+        except UnsupportedRequest as err:
+            self._error(400, "unsupported_request", str(err))
+        except KeyError as err:
+            self._error(404, "search_context_missing_exception", str(err))
+        except (ValueError, TypeError) as err:
+            self._error(400, "parsing_exception", str(err))
+
+    def do_DELETE(self):
+        parts, params = self._route()
+        if parts == ["_search", "scroll"]:
+            body = self._body()
+            ids = body.get("scroll_id", [])
+            for scroll_id in [ids] if isinstance(ids, str) else ids:
+                self.server.scrolls.pop(scroll_id, None)
+            self._reply(200, {"succeeded": True, "num_freed": len(ids)})
+        else:
+            self._error(404, "not_found", "no handler for %s" % self.path)
+
+
+def add_dataset_args(parser):
+    parser.add_argument("--users", type=int, default=50,
+        help="Number of synthetic users (default: %(default)s)")
+    parser.add_argument("--days", type=int, default=60,
+        help="Number of days of synthetic usage, up to today (default: %(default)s)")
+    parser.add_argument("--records", type=int, default=20,
+        help="Jobs per user per active day (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=1,
+        help="Random seed of the synthetic data (default: %(default)s)")
+    parser.add_argument("--load", metavar="FILE",
+        help="Serve the recorded hits in FILE (JSON lines) instead of synthetic data")
+
+
+def dataset_from_args(args):
+    generated = synthetic(args.users, args.days, args.records, args.seed)
+    if args.load is None:
+        return generated
+    with open(args.load) as f:
+        return Dataset.load(f, topology_xml=generated.topology_xml)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__,
+                formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_dataset_args(parser)
+    parser.add_argument("--port", type=int, default=9200,
+        help="Port to listen on (default: %(default)s)")
+    parser.add_argument("--dump", metavar="FILE",
+        help="Write the documents to FILE as JSON lines and exit")
+    args = parser.parse_args(argv[1:])
+
+    dataset = dataset_from_args(args)
+    if args.dump:
+        with open(args.dump, "w") as f:
+            dataset.dump(f)
+        return 0
+
+    server = FakeGRACC(dataset, ("127.0.0.1", args.port))
+    for index, docs in sorted(dataset.indices.items()):
+        print("%-26s%d documents" % (index, len(docs)), file=sys.stderr)
+    print("Serving on %s" % server.url, file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
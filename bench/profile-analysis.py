@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""Time the analysis steps of calculate-waittime and connect-origin-users on
+synthetic inputs, with no GRACC at all
+
+The inputs come from workloads.py, at the default sizes times --scale:
+
+    decodeUsersPerDay   per-day aggregation buckets -> users x days table
+    getIdleUsers        users x days table -> returning users
+    getQueueTimes       synthetic job streams for each returning user
+    count_users         monthly logical_dirname sets -> new/active users
+
+With --profile, each step is run under cProfile and the top functions are
+printed; getQueueTimes is then replaced by a serial loop over
+getUserQueueTime, since cProfile does not follow the worker threads.
+
+"""
+
+import argparse
+import cProfile
+import importlib.util
+import os
+import pstats
+import sys
+import time
+import types
+
+import workloads
+
+
+TOPDIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+
+USERS = 1000
+DAYS = 45
+JOBS_PER_DAY = 200
+OSDF_USERS = 2000
+MONTHS = 7
+
+
+def load_tool(path, name):
+    """Import one of the tool scripts (which have dashes in their names)"""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(TOPDIR, path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def timed(name, profile, func, *args):
+    profiler = cProfile.Profile() if profile else None
+    t0 = time.time()
+    if profiler:
+        profiler.enable()
+    result = func(*args)
+    if profiler:
+        profiler.disable()
+    print("%-20s%8.2fs" % (name, time.time() - t0))
+    if profiler:
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(12)
+    return result
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__,
+                formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=1,
+        help="Multiply the number of users and days by this (default: %(default)s)")
+    parser.add_argument("--jobs-scale", type=float, default=1,
+        help="Multiply the jobs per user per day by this (default: %(default)s)")
+    parser.add_argument("--idle-prob", type=float, default=0.3,
+        help="Chance that a user has no usage on a day (default: %(default)s)")
+    parser.add_argument("--returning", type=float, default=0.2,
+        help="Fraction of users that stop for a while and come back (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=1,
+        help="Workers for getQueueTimes (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--profile", action="store_true",
+        help="Print a cProfile summary of each step")
+    args = parser.parse_args(argv[1:])
+
+    users = int(USERS * args.scale)
+    days = int(DAYS * args.scale)
+    jobs_per_day = int(JOBS_PER_DAY * args.jobs_scale)
+    print("%d users, %d days, %d jobs per user-day, %d OSDF users"
+          % (users, days, jobs_per_day, int(OSDF_USERS * args.scale)))
+
+    waittime = load_tool("osg-project-waittime/calculate-waittime.py", "calculate_waittime")
+    origin = load_tool("connect-origin-users/connect-origin-users.py", "connect_origin_users")
+
+    t0 = time.time()
+    matrix = workloads.usage_matrix(users, days, idle_prob=args.idle_prob,
+                                    returning=args.returning, seed=args.seed)
+    buckets = workloads.day_buckets(matrix, seed=args.seed)
+    monthSets = workloads.monthly_dirnames(int(OSDF_USERS * args.scale), MONTHS,
+                                           seed=args.seed)
+    print("%-20s%8.2fs" % ("(generate inputs)", time.time() - t0))
+
+    perDay = timed("decodeUsersPerDay", args.profile, waittime.decodeUsersPerDay, buckets)
+    idle = timed("getIdleUsers", args.profile, waittime.getIdleUsers, perDay)
+    print("%d returning users" % len(idle))
+
+    # Read the job streams in place of GRACC
+    waittime.generateRawQuery = lambda user, starttime, endtime: (user, starttime, endtime)
+    waittime.gracc = types.SimpleNamespace(search_after=lambda q: workloads.job_stream(
+        *q, jobs_per_day=jobs_per_day, seed=args.seed))
+    waittime.print = lambda *a, **kw: None
+    if args.profile:
+        # cProfile only sees the calling thread, so scan the users here
+        timed("getUserQueueTime", True,
+              lambda users: list(map(waittime.getUserQueueTime, users)), idle)
+    else:
+        timed("getQueueTimes", False, waittime.getQueueTimes, idle, args.workers)
+
+    newUsers, activeUsers = timed("count_users", args.profile, origin.count_users, monthSets)
+    print("%d active, %d new OSDF users" % (activeUsers, len(newUsers)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""Time the GRACC metric tools end to end against the offline stand-in
+
+Starts fakegracc with a synthetic (or recorded) data set, runs each tool
+against it a number of times, and reports the wall time of each tool along
+with the number of GRACC requests it made and the server time they took
+(from the query log).  With --baseline, the median wall times are compared
+with those of an earlier --json report, and the exit status is non-zero if
+any tool got slower than --max-slowdown times its baseline.
+
+The tools run from the checkout given with --tree (default: this one), so
+the same harness and data can time two versions of the tools.  Tools that
+are missing from, or fail in, another checkout are skipped rather than
+failed, and have no baseline; a checkout without the gracc package is not
+run at all, as its tools would not use the stand-in.
+
+"""
+
+import argparse
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import fakegracc
+
+
+TOPDIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+
+
+def tool_commands(start_date, end_date, outdir):
+    """name -> (directory, command line) of each GRACC-backed tool"""
+    out = lambda name: os.path.join(outdir, name)
+    return {
+        "campuses-with-active-researchers": ("campuses-with-active-researchers",
+            ["./campuses-with-active-researchers.py", "--csv", start_date, end_date]),
+        "campus-contributions": ("campus-contributions",
+            ["./campus-contributions", "--json", start_date, end_date]),
+        "osg-cpu-hours": ("osg-cpu-hours",
+            ["./osg-cpu-hours.py", "-o", out("osg-cpu-hours.json")]),
+        "calculate-waittime": ("osg-project-waittime",
+            ["./calculate-waittime.py", out("osg-waittime.csv"), start_date, end_date]),
+        "calculate-waittime-batch": ("osg-project-waittime",
+            ["./calculate-waittime.py", "--engine", "batch",
+             out("osg-waittime-batch.csv"), start_date, end_date]),
+        "connect-origin-users": ("connect-origin-users",
+            ["./connect-origin-users.py", "-o", out("connect-origin-users.json")]),
+    }
+
+
+def query_stats(logpath):
+    """Number of requests, server time and response bytes in a query log"""
+    stats = {"requests": 0, "took_ms": 0, "response_bytes": 0}
+    if not os.path.exists(logpath):
+        return stats
+    with open(logpath) as f:
+        for line in f:
+            record = json.loads(line)
+            stats["requests"] += 1
+            stats["took_ms"] += record.get("took_ms") or 0
+            stats["response_bytes"] += record.get("response_bytes") or 0
+    return stats
+
+
+def run_tool(name, cwd, argv, env, workdir, timeout):
+    """Run one tool once; return (exit status, wall time, query stats)"""
+    logpath = os.path.join(workdir, name + ".queries.jsonl")
+    if os.path.exists(logpath):
+        os.remove(logpath)
+    env = dict(env, GRACC_QUERY_LOG=logpath)
+    t0 = time.time()
+    with open(os.path.join(workdir, name + ".log"), "ab") as log:
+        try:
+            ret = subprocess.run(argv, cwd=cwd, env=env, stdout=log,
+                                 stderr=log, timeout=timeout).returncode
+        except subprocess.TimeoutExpired:
+            ret = None
+    return ret, time.time() - t0, query_stats(logpath)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__,
+                formatter_class=argparse.RawDescriptionHelpFormatter)
+    fakegracc.add_dataset_args(parser)
+    parser.add_argument("--repeat", type=int, default=3,
+        help="How many times to run each tool (default: %(default)s)")
+    parser.add_argument("--tree", default=TOPDIR,
+        help="Checkout whose tools to run (default: this one)")
+    parser.add_argument("--gracc-cache", action="store_true",
+        help="Let the tools use the per-day GRACC cache (kept between repeats)")
+    parser.add_argument("--timeout", type=int, default=1800,
+        help="Seconds each run of a tool may take (default: %(default)s)")
+    parser.add_argument("--json", metavar="FILE",
+        help="Write the results to FILE")
+    parser.add_argument("--baseline", metavar="FILE",
+        help="Compare with the results in FILE, from an earlier --json")
+    parser.add_argument("--max-slowdown", type=float, default=1.5,
+        help="Fail if a tool's median time is more than this many times its "
+             "baseline (default: %(default)s)")
+    parser.add_argument("tools", nargs="*", metavar="TOOL",
+        help="Only run these tools")
+    args = parser.parse_args(argv[1:])
+
+    t0 = time.time()
+    server = fakegracc.FakeGRACC(fakegracc.dataset_from_args(args)).start()
+    ndocs = {index: len(docs) for index, docs in server.dataset.indices.items()}
+    print("Data set ready in %.1fs: %s" % (time.time() - t0, ", ".join(
+        "%d %s" % (n, index) for index, n in sorted(ndocs.items()))), file=sys.stderr)
+
+    today = datetime.date.today()
+    start_date = (today - datetime.timedelta(days=30)).isoformat()
+    end_date = (today - datetime.timedelta(days=1)).isoformat()
+    workdir = tempfile.mkdtemp(prefix="metrics-bench.")
+    commands = tool_commands(start_date, end_date, workdir)
+    names = args.tools or list(commands)
+    unknown = set(names) - set(commands)
+    if unknown:
+        parser.error("Unknown tools: %s" % ", ".join(sorted(unknown)))
+
+    env = dict(os.environ,
+        GRACC_URL=server.url,
+        GRACC_BACKOFF="0.1",
+        TOPOLOGY_RGSUMMARY_URL=server.url + "/rgsummary/xml",
+        TOPOLOGY_CACHE_DIR=os.path.join(workdir, "topology"),
+        ACTIVE_ORGS_BASELINE_DIR=os.path.join(workdir, "active-orgs"),
+        OSDF_USERS_STORE=os.path.join(workdir, "osdf-users.sqlite"),
+    )
+    if args.gracc_cache:
+        env["GRACC_CACHE"] = os.path.join(workdir, "gracc.sqlite")
+    else:
+        env.pop("GRACC_CACHE", None)
+
+    tree = os.path.abspath(args.tree)
+    other_tree = os.path.realpath(tree) != os.path.realpath(TOPDIR)
+    skipped = []
+    if other_tree and not os.path.isdir(os.path.join(tree, "gracc")):
+        # Its tools would ignore GRACC_URL and query the real GRACC
+        print("%s has no gracc package; not running its tools" % tree, file=sys.stderr)
+        skipped, names = names, []
+
+    results = {}
+    failed = []
+    for name in names:
+        subdir, cmd = commands[name]
+        cwd = os.path.join(tree, subdir)
+        if other_tree and not os.path.exists(os.path.join(cwd, cmd[0])):
+            skipped.append(name)
+            continue
+        times = []
+        for i in range(args.repeat):
+            ret, walltime, stats = run_tool(name, cwd, cmd, env, workdir, args.timeout)
+            if ret != 0:
+                # A tool that fails in another checkout (eg, one that predates an option) is
+                # left without a baseline rather than failing the comparison
+                (skipped if other_tree else failed).append(name)
+                print("%s failed (%s); see %s" % (name, "timeout" if ret is None
+                      else "exit status %d" % ret,
+                      os.path.join(workdir, name + ".log")), file=sys.stderr)
+                break
+            times.append(walltime)
+        if times:
+            results[name] = dict(stats, wall_s=times,
+                                 median_s=statistics.median(times),
+                                 min_s=min(times))
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    fmt_string = "%-34s%10s%10s%10s%12s%10s"
+    print(fmt_string % ("Tool", "Median", "Min", "Requests", "Server ms", "Baseline"))
+    slower = []
+    for name, r in results.items():
+        base = baseline.get(name, {}).get("median_s")
+        ratio = "none" if args.baseline else ""
+        if base:
+            ratio = "x%.2f" % (r["median_s"] / base)
+            if r["median_s"] > base * args.max_slowdown:
+                slower.append(name)
+        print(fmt_string % (name, "%.2fs" % r["median_s"], "%.2fs" % r["min_s"],
+                            r["requests"], r["took_ms"], ratio))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"dataset": {"users": args.users, "days": args.days,
+                                   "records": args.records, "seed": args.seed,
+                                   "load": args.load, "documents": ndocs},
+                       "repeat": args.repeat,
+                       "results": results}, f, indent=2, sort_keys=True)
+
+    server.shutdown()
+    if skipped:
+        print("Skipped in %s (missing or failed), so no baseline: %s"
+              % (tree, ", ".join(skipped)), file=sys.stderr)
+    if failed:
+        print("Failed: %s" % ", ".join(failed), file=sys.stderr)
+    if slower:
+        print("Slower than %.2fx the baseline: %s"
+              % (args.max_slowdown, ", ".join(slower)), file=sys.stderr)
+    return 1 if failed or slower else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,150 @@
+"""Synthetic inputs for the analysis steps of the waittime and OSDF user tools.
+
+Unlike fakegracc, which serves documents for the tools to query, these are
+generated directly in the shapes the analysis functions take, so that they
+can be profiled at sizes far beyond what a stand-in server could serve:
+
+    usage_matrix     users x days CoreHours table, as from getUsersPerDay
+    day_buckets      the per-day (DN, ProjectName) composite aggregation
+                     buckets that decodeUsersPerDay turns into that table
+    job_stream       one user's raw job records in StartTime order, as
+                     getUserQueueTime reads them from gracc.search_after
+    monthly_dirnames the logical_dirname set of each month, as built by
+                     calculate_users
+
+Each takes a seed, so the same arguments always give the same data.
+
+"""
+
+import datetime
+import zlib
+
+import numpy as np
+import pandas as pd
+
+
+def usage_matrix(users=1000, days=45, end=None, mean_hours=40.0,
+                 idle_prob=0.3, returning=0.2, gap=(15, 30), seed=1):
+    """Return a users x days DataFrame of CoreHours like getUsersPerDay's.
+
+    Each user starts on a random day and then has no usage on a fraction
+    `idle_prob` of days; a fraction `returning` of the users also stop for
+    `gap` (min, max) days somewhere in the range and then come back with
+    heavier usage, which is what getIdleUsers looks for.  Usage on active
+    days is lognormal with mean `mean_hours`.
+    """
+    rng = np.random.default_rng(seed)
+    if end is None:
+        end = datetime.date.today()
+    columns = pd.date_range(end=pd.Timestamp(end) - pd.Timedelta(days=1),
+                            periods=days, freq="D")
+    day = np.arange(days)
+
+    start = rng.integers(0, days, size=users)
+    active = (day >= start[:, None]) & (rng.random((users, days)) >= idle_prob)
+
+    usage = rng.lognormal(np.log(mean_hours) - 0.5, 1.0, size=(users, days))
+    back = rng.random(users) < returning
+    leave = rng.integers(0, days, size=users)
+    length = rng.integers(gap[0], gap[1] + 1, size=users)
+    away = back[:, None] & (day >= leave[:, None]) & (day < (leave + length)[:, None])
+    returned = back[:, None] & (day >= (leave + length)[:, None])
+    usage = np.where(returned, usage * 5, usage)
+    usage = np.where(active & ~away, usage, 0).astype(np.float32)
+
+    index = ["/OU=LocalUser/CN=user%d" % u for u in range(users)]
+    return pd.DataFrame(usage, index=index, columns=columns)
+
+
+def day_buckets(matrix, projects_per_user=1, seed=1):
+    """Return the per-day buckets of the (DN, ProjectName) composite
+    aggregation, with CoreHours, that decode into matrix, splitting each
+    user's usage over `projects_per_user` projects"""
+    rng = np.random.default_rng(seed)
+    usage = matrix.to_numpy()
+    nprojects = max(1, len(matrix.index) // 3)
+    projects = {user: ["Project%d" % p for p in
+                       rng.choice(nprojects, size=projects_per_user)]
+                for user in matrix.index}
+    buckets = []
+    for d, day in enumerate(matrix.columns):
+        entries = []
+        for u in np.flatnonzero(usage[:, d]):
+            user = matrix.index[u]
+            share = float(usage[u, d]) / projects_per_user
+            entries.extend({"key": {"DN": user, "ProjectName": p},
+                            "doc_count": 1,
+                            "CoreHours": {"value": share}}
+                           for p in projects[user])
+        buckets.append({"key": int(day.value // 10**6),
+                        "doc_count": len(entries),
+                        "UserProject": {"buckets": entries}})
+    return buckets
+
+
+def job_stream(user, starttime, endtime, jobs_per_day=200, mean_wall=3600.0,
+               mean_queue=1800.0, no_queuetime=0.0, seed=1):
+    """Yield the raw job records of user from starttime up to endtime in
+    StartTime order, like the hits of generateRawQuery.
+
+    Jobs are generated a day at a time, so a consumer that stops early (as
+    getUserQueueTime does once it has seen 1000 hours) only pays for the
+    days it reads.  A fraction `no_queuetime` of the records have no
+    QueueTime, like those of some older probes.
+    """
+    rng = np.random.default_rng([seed, zlib.crc32(user.encode())])
+    day = pd.Timestamp(starttime).normalize().to_pydatetime()
+    endtime = pd.Timestamp(endtime).to_pydatetime()
+    fmt = "%Y-%m-%dT%H:%M:%SZ"
+    second = datetime.timedelta(seconds=1)
+    while day < endtime:
+        n = rng.poisson(jobs_per_day)
+        start = np.sort(rng.uniform(0, 86400, size=n)).tolist()
+        wall = rng.exponential(mean_wall, size=n).tolist()
+        queue = rng.exponential(mean_queue, size=n).tolist()
+        cores = rng.choice([1, 1, 1, 2, 4, 8], size=n).tolist()
+        has_queue = (rng.random(n) >= no_queuetime).tolist()
+        for i in range(n):
+            started = day + start[i] * second
+            record = {
+                "StartTime": started.strftime(fmt),
+                "EndTime": (started + wall[i] * second).strftime(fmt),
+                "WallDuration": wall[i],
+                "CoreHours": wall[i] * cores[i] / 3600,
+            }
+            if has_queue[i]:
+                record["QueueTime"] = (started - queue[i] * second).strftime(fmt)
+            yield record
+        day += datetime.timedelta(days=1)
+
+
+def monthly_dirnames(users=2000, months=7, end=None, active_prob=0.4,
+                     new_prob=0.05, seed=1):
+    """Return {key_as_string: set of logical_dirname} for the `months` months
+    up to the month of `end`, like the month sets of calculate_users.
+
+    Each of the `users` users is active in a month with probability
+    `active_prob` once they have started; a fraction `new_prob` start in the
+    last month, so show up as new users.
+    """
+    rng = np.random.default_rng(seed)
+    if end is None:
+        end = datetime.date.today()
+    last = pd.Timestamp(end).to_period("M")
+    periods = [last - (months - 1 - i) for i in range(months)]
+
+    first = rng.integers(0, months - 1, size=users) if months > 1 \
+            else np.zeros(users, dtype=int)
+    first[rng.random(users) < new_prob] = months - 1
+    active = rng.random((users, months)) < active_prob
+    active[np.arange(users), first] = True
+    active &= np.arange(months) >= first[:, None]
+
+    aps = np.array(["ap20.uc.osg-htc.org", "ap40.uw.osg-htc.org",
+                    "ap21.uc.osg-htc.org"])
+    names = ["/ospool/%s/data/user%d" % (aps[u % len(aps)], u) for u in range(users)]
+    return {
+        period.start_time.strftime("%Y-%m-%dT%H:%M:%S.000Z"):
+            set(names[u] for u in np.flatnonzero(active[:, m]))
+        for m, period in enumerate(periods)
+    }
@@ -5,13 +5,13 @@ from __future__ import print_function
 import os
 import sys
 import datetime
-import opensearchpy
+import collections
 from opensearchpy import Search, A, Q
 
-gracc_url = 'https://gracc.opensciencegrid.org/q'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+import gracc
 
-es = opensearchpy.OpenSearch(
-                [gracc_url], timeout=300, use_ssl=True, verify_certs=True)
+es = gracc.get_client()
 
 jobs_raw_index = 'gracc.osg.raw-*'
 jobs_summary_index = 'gracc.osg.summary'
@@ -21,23 +21,26 @@ def getdate(datestr):
 
 
 _min_CoreHours = 1.0
+@gracc.instrumented
 def get_oscf_facilities(first_day, last_day):
     s = Search(using=es, index=jobs_summary_index)
     start = getdate(first_day)
+    # as before, the window ends at the start of last_day; the EndTime range
+    # is applied per day by gracc.daily_buckets
     end   = getdate(last_day)
-    filters = (
-            Q('range', EndTime={'gte': start, 'lte': end })
-         &  Q('term',  ResourceType='Batch')
-    )
+    filters = Q('term', ResourceType='Batch')
     q = s.query('bool', filter=[filters])
-    q.aggs.bucket('Facility',  'terms', size=9999, field='OIM_Facility') \
-          .bucket('CoreHours', 'sum',              field='CoreHours')
-    resp = q.execute()
-    aggs = resp.aggregations
+    q.aggs.bucket('Facility',  'composite', size=10000,
+                  sources=[{'Facility': {'terms': {'field': 'OIM_Facility'}}}]) \
+          .bucket('CoreHours', 'sum',       field='CoreHours')
+    corehours = collections.Counter()
+    for day in gracc.daily_buckets(q, start, end, field='EndTime'):
+        for facility in day['Facility']['buckets']:
+            corehours[facility['key']['Facility']] += facility['CoreHours']['value']
     return set(
-        facility.key
-        for facility in aggs.Facility.buckets
-        if facility.CoreHours.value >= _min_CoreHours
+        facility
+        for facility, hours in corehours.items()
+        if hours >= _min_CoreHours
     )
 
 
@@ -7,23 +7,8 @@ import operator
 import sys
 import os
 
-try:
-    from urllib.request import urlopen
-except ImportError:
-    from urllib2 import urlopen
-
-import xml.etree.ElementTree as et
-
-
-_topology_host = "topology.opensciencegrid.org"
-_rgsummary_url = 'https://{host}/rgsummary/xml'.format(host=_topology_host)
-_active_params = [
-    ('active',        'on'),  # filter resources by "Active" field
-    ('active_value',  '1' ),  # require Active: true
-    ('disable',       'on'),  # filter resources by "Disable" field
-    ('disable_value', '0' ),  # require Disable: false
-]
-_xml_url = "%s?%s" % (_rgsummary_url, '&'.join(map('='.join, _active_params)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+import topology
 
 
 _osdf_service_types = [
@@ -34,21 +19,13 @@ _osdf_service_types = [
 ]
 
 
-def getxml():
-    return urlopen(_xml_url).read()
-
-
 def get_osdf_facilities(xmltxt=None):
     if xmltxt is None:
-        xmltxt = getxml()
-    xmltree = et.fromstring(xmltxt)
-    return set(
-        rg.find("Facility").find("Name").text
-        for rg in xmltree.findall('ResourceGroup')
-        for r in rg.find('Resources').findall('Resource')
-        for s in r.find("Services").findall("Service")
-        if s.find("Name").text in _osdf_service_types
-    )
+        topo = topology.get_topology()
+    else:
+        topo = topology.parse(xmltxt)
+    # active, enabled resources only
+    return topo.facilities(services=_osdf_service_types, enabled=True)
 
 
 def main():
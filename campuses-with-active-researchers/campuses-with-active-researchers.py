@@ -9,72 +9,34 @@ the definition of 'active researcher'.
 
 from argparse import ArgumentParser
 import csv
-import opensearchpy
 from opensearchpy import Search, A, Q
 import datetime
+import json
+import os
 import sys
-from typing import List, Optional, Set
-import urllib3
-import xml.etree.ElementTree as ET
-
-
-GRACC = "https://gracc.opensciencegrid.org/q"
-TOPOLOGY_RGSUMMARY = "https://topology.opensciencegrid.org/rgsummary/xml"
-
-
-def safe_elem_text(elem: Optional[ET.Element]) -> str:
-    """Return the stripped text of an element if available.  If not available, return the empty string"""
-    text = getattr(elem, "text", "")
-    return text.strip()
-
-
-def get_topology_resourcegroups() -> List[ET.Element]:
-    """Return the ElementTree Elements of the active, enabled ResourceGroups in the rgsummary XML"""
-    http = urllib3.PoolManager()
-    r = http.request(
-        "GET",
-        TOPOLOGY_RGSUMMARY,
-        # active=on turns on filtering by the 'active' field;
-        # active_value=1 means the output should only contain active resources.
-        # (Without active=on, topology ignores active_value.)
-        # disable and disable_value work the same way.
-        fields={
-            "active": "on",
-            "active_value": "1",
-            "disable": "on",
-            "disable_value": "0",
-        },
-    )
-    root = ET.fromstring(r.data.decode("utf-8", errors="replace"))
-    return root.findall("./ResourceGroup")
-
-
-def is_resourcegroup_ccstar(resourcegroup: ET.Element) -> bool:
-    return "CC*" in get_resourcegroup_tags(resourcegroup)
-
+from typing import Set
 
-def get_resourcegroup_facility(resourcegroup: ET.Element) -> str:
-    """Return the name of the facility the ResourceGroup is in"""
-    return safe_elem_text(resourcegroup.find("./Facility/Name"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+import gracc
+import topology
 
 
-def get_resourcegroup_tags(resourcegroup: ET.Element) -> Set[str]:
-    """Get the union of the tags of all the Resources in a ResourceGroup"""
-    return set(
-        safe_elem_text(e)
-        for e in resourcegroup.findall("./Resources/Resource/Tags/Tag")
-    )
+# SOFTWARE-5361: the date range whose active organizations are not "New"
+BASELINE_STARTDATE = "2020-10-01"
+BASELINE_ENDDATE = "2022-09-30"
+BASELINE_VERSION = 1
+BASELINE_DIR = os.environ.get(
+    "ACTIVE_ORGS_BASELINE_DIR",
+    os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", ".cache", "active-orgs"),
+)
 
 
 def get_ccstar_facilities() -> Set[str]:
-    """Get a set of the names of the facilities that have the CC* tag"""
-    return set(
-        get_resourcegroup_facility(rg)
-        for rg in get_topology_resourcegroups()
-        if is_resourcegroup_ccstar(rg)
-    )
+    """Get a set of the names of the facilities that have active, enabled resources with the CC* tag"""
+    return topology.get_topology().facilities(tag="CC*", enabled=True)
 
 
+@gracc.instrumented
 def get_organizations_with_active_researchers(
     starttime: datetime.datetime, endtime: datetime.datetime
 ) -> Set[str]:
@@ -82,31 +44,28 @@ def get_organizations_with_active_researchers(
     The field OIM_Organization is taken from the Organizations in the projects YAML files.
 
     """
-    es = opensearchpy.OpenSearch(
-        [GRACC],
-        timeout=300,
-        use_ssl=True,
-        verify_certs=True,
-    )
+    es = gracc.get_client()
 
-    MAXSZ = 2 ** 30
     index = "gracc.osg.summary"
     s = Search(using=es, index=index)
-    # Starttime and endtime are both datetime objects
+    # Starttime and endtime are both datetime objects; the EndTime range is
+    # applied per day by gracc.daily_buckets
     s = s.query(
         "bool",
         filter=[
-            Q("range", EndTime={"gte": starttime, "lt": endtime})
-            & Q("term", ResourceType="Payload")
+            Q("term", ResourceType="Payload")
         ],
     )
 
-    bkt = s.aggs
-    bkt = bkt.bucket("Organization", "terms", size=MAXSZ, field="OIM_Organization")
-
-    response = s.execute()
+    s.aggs.bucket("Organization", "composite", size=10000, sources=[
+        {"Organization": {"terms": {"field": "OIM_Organization"}}},
+    ])
 
-    return {f["key"] for f in response.aggregations["Organization"]["buckets"]}
+    return {
+        f["key"]["Organization"]
+        for day in gracc.daily_buckets(s, starttime, endtime, field="EndTime")
+        for f in day["Organization"]["buckets"]
+    }
 
 
 def get_organizations_with_active_researchers__dates(
@@ -129,6 +88,44 @@ def get_organizations_with_active_researchers__dates(
     return get_organizations_with_active_researchers(starttime, endtime)
 
 
+def get_baseline_active_organizations(
+    startdate: str, enddate: str, parser: ArgumentParser, refresh: bool = False
+) -> Set[str]:
+    """Return the organizations with active researchers in a closed, historical date range.
+
+    The result is saved in BASELINE_DIR in a file named for the date range, and read back
+    from there on later runs instead of querying GRACC again, unless `refresh` is set or
+    the file was written by an incompatible version.
+
+    """
+    path = os.path.join(BASELINE_DIR, "active-orgs_{}_{}.json".format(startdate, enddate))
+    if not refresh:
+        try:
+            with open(path) as f:
+                baseline = json.load(f)
+            if (baseline.get("version") == BASELINE_VERSION
+                    and baseline.get("startdate") == startdate
+                    and baseline.get("enddate") == enddate):
+                return set(baseline["organizations"])
+        except (OSError, ValueError, KeyError):
+            pass
+
+    organizations = get_organizations_with_active_researchers__dates(startdate, enddate, parser)
+    baseline = {
+        "version": BASELINE_VERSION,
+        "startdate": startdate,
+        "enddate": enddate,
+        "generated_at": datetime.datetime.now().strftime("%F %H:%M"),
+        "organizations": sorted(organizations),
+    }
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    tmppath = path + ".tmp"
+    with open(tmppath, "w") as f:
+        json.dump(baseline, f, indent=2)
+    os.replace(tmppath, path)
+    return organizations
+
+
 def main(argv):
     parser = ArgumentParser(description=__doc__)
     parser.add_argument(
@@ -142,14 +139,21 @@ def main(argv):
         help="Last day in the date range in YEAR-MONTH-DAY format",
     )
     parser.add_argument("--csv", action="store_true", help="Print in CSV format")
+    parser.add_argument(
+        "--refresh-baseline",
+        action="store_true",
+        help="Re-query the {} through {} organizations instead of using the saved copy".format(
+            BASELINE_STARTDATE, BASELINE_ENDDATE
+        ),
+    )
 
     args = parser.parse_args(argv[1:])
 
     runtime = datetime.datetime.now()
     # SOFTWARE-5361: "New" means, "In the list when run for the past 30 days,
     # but NOT in the list when run for 2020-10-01 thru 2022-09-30".
-    old_active_orgs = get_organizations_with_active_researchers__dates(
-        "2020-10-01", "2022-09-30", parser
+    old_active_orgs = get_baseline_active_organizations(
+        BASELINE_STARTDATE, BASELINE_ENDDATE, parser, refresh=args.refresh_baseline
     )
     active_organizations = get_organizations_with_active_researchers__dates(
         args.startdate, args.enddate, parser
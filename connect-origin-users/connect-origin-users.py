@@ -4,7 +4,9 @@
 
 # Calculate the number of new and active users for the OSG Connect origin
 
+import array
 import calendar
+import os
 import re
 import sys
 import json
@@ -12,51 +14,135 @@ import time
 import datetime
 import collections
 import argparse
-import opensearchpy
+import sqlite3
+import zlib
 from opensearchpy import Search, A, Q
 from dateutil import parser, relativedelta
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+import gracc
+import idsets
 
 
+# Users seen in each closed month, so that only the open months are queried
+DEFAULT_STORE = os.environ.get(
+    "OSDF_USERS_STORE",
+    os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", ".cache", "osdf-users.sqlite"),
+)
 
-def calculate_users(endtime, months):
+# Late transfer records can still arrive for a while after a month ends
+CLOSED_AFTER = datetime.timedelta(days=7)
 
-    gracc_url = 'https://gracc.opensciencegrid.org/q'
+OSDF_INDEX = 'xrd-stash*'
 
-    es = opensearchpy.OpenSearch(
-                    [gracc_url], timeout=300, use_ssl=True, verify_certs=True)
 
-    osdf_index = 'xrd-stash*'
+class MonthStore:
+    """
+    SQLite store of the users (logical_dirname) seen in each closed month.
+    Each name is given a small integer id once, and a month is kept as the
+    sorted array of its users' ids.
+    """
 
-    s = Search(using=es, index=osdf_index)
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=60)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS names (
+                id INTEGER PRIMARY KEY,
+                name TEXT UNIQUE NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS months (
+                month TEXT PRIMARY KEY,
+                fetched TEXT NOT NULL,
+                users BLOB NOT NULL
+            );
+        """)
+        self.ids = dict((name, id) for id, name in self.db.execute("SELECT id, name FROM names"))
+        self.names = dict((id, name) for name, id in self.ids.items())
+
+    def intern(self, names):
+        """Return the set of ids of names, giving new names the next free ids"""
+        ids = set()
+        for name in names:
+            if name not in self.ids:
+                id = len(self.ids) + 1
+                self.db.execute("INSERT INTO names VALUES (?, ?)", (id, name))
+                self.ids[name] = id
+                self.names[id] = name
+            ids.add(self.ids[name])
+        return ids
+
+    def get(self, month):
+        """The set of user ids of month, or None if it is not stored"""
+        row = self.db.execute("SELECT users FROM months WHERE month = ?", (month,)).fetchone()
+        if row is None:
+            return None
+        return set(array.array('I', zlib.decompress(row[0])))
+
+    def put(self, month, ids):
+        users = zlib.compress(array.array('I', sorted(ids)).tobytes())
+        self.db.execute("INSERT OR REPLACE INTO months VALUES (?, ?, ?)",
+                        (month, datetime.datetime.utcnow().isoformat(), users))
+
+    def clear(self):
+        self.db.execute("DELETE FROM months")
+
+    def commit(self):
+        self.db.commit()
 
-    # For the last 6 months, aggregate by user
-    endtimeDate = parser.parse(endtime)
-    
-    # Round to end of the endtime month
-    endtimeDate = endtimeDate.replace(day=calendar.monthrange(endtimeDate.year, endtimeDate.month)[1], hour=23, minute=59, second=59)
-    starttimeDate = endtimeDate - relativedelta.relativedelta(months=months)
-    #print("Start time: {}".format(starttimeDate))
-    #print("End time: {}".format(endtimeDate))
-    s = s.filter('range', **{'@timestamp': {'gte': starttimeDate, 'lte': endtimeDate}})
+
+def osdf_search(starttime, endtime):
+    """Search of the /ospool transfer records from starttime up to endtime"""
+    s = Search(using=gracc.get_client(), index=OSDF_INDEX)
+    s = s.filter('range', **{'@timestamp': {'gte': starttime, 'lt': endtime}})
 
     # Have to use the odd dirname1__keyword so that it matches exactly '/ospool', otherwise
     # it can match substrings such as just ospool
     # Also, remove the monitoring directory
     q = Q('match', dirname1__keyword='/ospool') & ~Q('match', dirname2__keyword='/ospool/monitoring')
-    s = s.query(q)
-    bkt = s.aggs
-    bkt = bkt.bucket('timestamp', A('date_histogram', field="@timestamp", calendar_interval="1M"))
-    bkt = bkt.bucket('logical_dirname', 'terms', field='logical_dirname.keyword', size=10000)
-    #print(s.to_dict())
-    response = s.execute()
-    #print(response.aggregations.to_dict())
-    monthSets = {}
-    for month in response.aggregations.timestamp.buckets:
-        monthSets[month.key_as_string] = set()
-        for user in month.logical_dirname.buckets:
-            monthSets[month.key_as_string].add(user.key)
+    return s.query(q)
+
+
+@gracc.instrumented
+def month_users(starttime, endtime):
+    """
+    Return the set of logical_dirnames with transfers from starttime up to
+    endtime, paging through all of them
+    """
+    s = osdf_search(starttime, endtime)
+    s.aggs.bucket('logical_dirname', 'composite', size=10000,
+                  sources=[{'logical_dirname': {'terms': {'field': 'logical_dirname.keyword'}}}])
+    return set(bucket["key"]["logical_dirname"]
+               for bucket in gracc.composite_buckets(s, 'logical_dirname'))
+
+
+@gracc.instrumented
+def first_month():
+    """The start of the first month with any /ospool transfers, or None if there are none"""
+    s = osdf_search(datetime.datetime(1970, 1, 1), datetime.datetime.utcnow()).extra(size=0)
+    s.aggs.metric('first', 'min', field='@timestamp')
+    first = s.execute().aggregations.first.value
+    if first is None:
+        return None
+    first = datetime.datetime.utcfromtimestamp(first / 1000)
+    return first.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
 
+
+def month_starts(first, last):
+    """The first day of each month from first through last"""
+    month = first.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    while month <= last:
+        yield month
+        month += relativedelta.relativedelta(months=1)
+
+
+def count_users(monthSets):
+    """
+    Given the set of users (logical_dirname) seen in each month, keyed by the
+    month's key_as_string, return the set of users of the most recent month
+    that were not seen in any previous month, and the number of users active
+    in the most recent month.  The users may be names or store ids.
+    """
     # Sort the months and put in an array
     def sort_months(x):
         return parser.parse(x).timestamp()
@@ -64,21 +150,64 @@ def calculate_users(endtime, months):
     #print(monthsSorted)
 
     # For the most recent month, find users that have not be in the previous months
-    lastMonth = monthsSorted[len(monthsSorted)-1]
-    #print("Last month: {}".format(lastMonth))
-    #print("Active users in last month: {}".format(len(months[lastMonth])))
-    activeUsers = len(monthSets[lastMonth])
-
-    # Calculate the new users by setting the most recent
-    # month and subtracting the previous months
-    #print(monthSets)
-    newUsers = monthSets[lastMonth]
-    for month in monthsSorted[:-1]:
-        newUsers -= monthSets[month]
+    months = idsets.Periods((month, monthSets[month]) for month in monthsSorted)
+    activeUsers = int(months.active()[-1])
+    newUsers = set(months.interner.keys(months.new(-1)))
+
+    return newUsers, activeUsers
+
+
+def month_range(endtime, months):
+    """
+    The start of the first month and the end of the last month of the
+    look-back, with the last month being that of endtime
+    """
+    endtimeDate = parser.parse(endtime)
     
+    # Round to end of the endtime month
+    endtimeDate = endtimeDate.replace(day=calendar.monthrange(endtimeDate.year, endtimeDate.month)[1], hour=23, minute=59, second=59)
+    if months:
+        starttimeDate = endtimeDate.replace(day=1, hour=0, minute=0, second=0) - relativedelta.relativedelta(months=months)
+    else:
+        starttimeDate = first_month() or endtimeDate
+    #print("Start time: {}".format(starttimeDate))
+    #print("End time: {}".format(endtimeDate))
+    return starttimeDate, endtimeDate
+
+
+def get_month_sets(starttimeDate, endtimeDate, store):
+    """
+    Return the store ids of the users seen in each month from starttimeDate
+    through endtimeDate, keyed by the month's key_as_string, in month order
+    """
+    # Closed months come from the store, once they have been read from GRACC
+    closed = datetime.datetime.utcnow() - CLOSED_AFTER
+    monthSets = {}
+    for month in month_starts(starttimeDate, endtimeDate):
+        monthEnd = month + relativedelta.relativedelta(months=1)
+        key = month.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        users = store.get(key)
+        if users is None:
+            users = store.intern(month_users(month, monthEnd))
+            if monthEnd <= closed:
+                store.put(key, users)
+        monthSets[key] = users
+    store.commit()
+    return monthSets
+
+
+@gracc.instrumented
+def calculate_users(endtime, months, store):
+
+    # For the last 6 months, aggregate by user
+    starttimeDate, endtimeDate = month_range(endtime, months)
+    monthSets = get_month_sets(starttimeDate, endtimeDate, store)
+
+    newUsers, activeUsers = count_users(monthSets)
+
     output = {
         "Number of new users": len(newUsers),
-        "New Users (directory paths)": list(newUsers),
+        "New Users (directory paths)": [store.names[id] for id in newUsers],
         "Active Users": activeUsers,
         "Date Range:": "{} - {}".format(
             endtimeDate.strftime("01 %b %Y"),
@@ -88,6 +217,39 @@ def calculate_users(endtime, months):
     return output
 
 
+@gracc.instrumented
+def calculate_series(endtime, months, store):
+    """
+    The number of new and active users of every month of the look-back, from
+    a single read of the month sets.  As for calculate_users, a user is new
+    in a month if they were not seen in the `months` months before it, so
+    that many more months are read before the first one reported.
+    """
+    starttimeDate, endtimeDate = month_range(endtime, months)
+    lookbackDate = starttimeDate - relativedelta.relativedelta(months=months)
+    monthSets = get_month_sets(lookbackDate, endtimeDate, store)
+
+    periods = idsets.Periods(monthSets.items())
+    newUsers = periods.new_counts(months or None)
+    activeUsers = periods.active()
+    series = []
+    for i in range(months, len(periods.labels)):
+        series.append({
+            "Month": parser.parse(periods.labels[i]).strftime("%Y-%m"),
+            "Active Users": int(activeUsers[i]),
+            "Number of new users": int(newUsers[i]),
+        })
+
+    output = {
+        "Series": series,
+        "Date Range:": "{} - {}".format(
+            starttimeDate.strftime("01 %b %Y"),
+            endtimeDate.strftime("%d %b %Y")
+        )
+    }
+    return output
+
+
 
 def add_args():
 
@@ -97,12 +259,21 @@ def add_args():
     argsparser = argparse.ArgumentParser(description='Calculate waittime for users')
     argsparser.add_argument("--outputfile", "-o", type=str, help="Output File", default="output.txt")
     argsparser.add_argument("--endtime", type=str, help="End Time, for example {}, will be rounded to the nearest month".format(defaultTime), default=defaultTime)
-    argsparser.add_argument("--months", type=int, help="Number of months to look back.  If a user is found in the previous months, they do not count as a new user for the month.", default=6)
+    argsparser.add_argument("--months", type=int, help="Number of months to look back.  If a user is found in the previous months, they do not count as a new user for the month.  0 looks back to the first transfer.", default=6)
+    argsparser.add_argument("--store", type=str, help="Store of the users of closed months (default: {})".format(DEFAULT_STORE), default=DEFAULT_STORE)
+    argsparser.add_argument("--full", help="Ignore the store and re-read every month from GRACC", action="store_true")
+    argsparser.add_argument("--series", help="Report the new and active users of every month of the look-back instead of only the last", action="store_true")
     return argsparser
 
 def main():
     args = add_args().parse_args()
-    output = calculate_users(args.endtime, args.months)
+    store = MonthStore(args.store)
+    if args.full:
+        store.clear()
+    if args.series:
+        output = calculate_series(args.endtime, args.months, store)
+    else:
+        output = calculate_users(args.endtime, args.months, store)
 
     with open(args.outputfile, 'w') as outfile:
         outfile.write(json.dumps(output, indent=4, sort_keys=True))
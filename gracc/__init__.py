@@ -0,0 +1,12 @@
+"""Shared helpers for the GRACC-backed metric tools.
+
+The tools live in their own directories and are run from there, so each
+one puts the top of the repository on sys.path before importing this
+package.
+
+"""
+
+from .client import GRACC_URL, configure, get_client
+from .paging import search_after, composite_buckets
+from .cache import daily_buckets, is_cached, day_aggregation, save_days
+from .querylog import instrumented
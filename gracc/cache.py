@@ -0,0 +1,248 @@
+"""On-disk cache of per-day aggregation results.
+
+Most of the tools aggregate gracc.osg.summary over long date ranges whose
+older days never change.  daily_buckets() runs the aggregations of a search
+once per day (nested under a one-day date_histogram, or for a composite
+aggregation, with the day as its first source) and keeps each day's bucket
+in an SQLite database, keyed by a fingerprint of the search and the
+day.  Later runs only query GRACC for days that are not in the cache, or
+that are recent enough that late records may still be arriving.  A tool
+that makes its own request over the whole range anyway can check is_cached()
+and, when the cache is cold, fill it from that same request by adding a
+day_aggregation() and passing its buckets to save_days().
+
+The cache is enabled by setting a database path, with configure() or the
+environment:
+
+    GRACC_CACHE               path to the SQLite cache file (default: no cache)
+    GRACC_CACHE_MUTABLE_DAYS  days back from today that are always re-queried
+                              (default 7)
+
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+
+from .paging import composite_buckets
+
+
+_settings = {
+    "path":         os.environ.get("GRACC_CACHE") or None,
+    "mutable_days": int(os.environ.get("GRACC_CACHE_MUTABLE_DAYS", 7)),
+}
+
+_schema = """
+CREATE TABLE IF NOT EXISTS daily (
+    fingerprint TEXT NOT NULL,
+    day         TEXT NOT NULL,
+    fetched     TEXT NOT NULL,
+    bucket      TEXT NOT NULL,
+    PRIMARY KEY (fingerprint, day)
+)
+"""
+
+_epoch = datetime.date(1970, 1, 1)
+
+
+def configure(**settings):
+    """Override cache settings (path, mutable_days)"""
+    unknown = set(settings) - set(_settings)
+    if unknown:
+        raise TypeError("unknown GRACC cache settings: %s"
+                        % ", ".join(sorted(unknown)))
+    _settings.update(settings)
+
+
+def enabled():
+    """Whether a cache path is set"""
+    return _settings["path"] is not None
+
+
+def fingerprint(s):
+    """Return a stable hash of the index, query and aggregations of Search s"""
+    desc = {"index": s._index, "body": s.to_dict()}
+    text = json.dumps(desc, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _connect():
+    path = _settings["path"]
+    dirname = os.path.dirname(os.path.abspath(path))
+    os.makedirs(dirname, exist_ok=True)
+    # other metrics may be writing to the same cache at the same time
+    db = sqlite3.connect(path, timeout=60)
+    db.execute(_schema)
+    return db
+
+
+def _day_range(starttime, endtime):
+    """Days whose start falls in [starttime, endtime)"""
+    first = starttime.date() if isinstance(starttime, datetime.datetime) \
+                             else starttime
+    if isinstance(endtime, datetime.datetime):
+        last = endtime.date()
+        if endtime.time() == datetime.time(0):
+            last -= datetime.timedelta(days=1)
+    else:
+        last = endtime - datetime.timedelta(days=1)
+    ndays = (last - first).days + 1
+    return [first + datetime.timedelta(days=i) for i in range(max(ndays, 0))]
+
+
+def _epoch_ms(day):
+    return (day - _epoch).days * 86400 * 1000
+
+
+def _query_days(s, field, first, last):
+    """Run the aggregations of s for each day from first through last"""
+    end = last + datetime.timedelta(days=1)
+    q = s.filter("range", **{field: {"gte": first, "lt": end}})
+    q = q.extra(size=0)
+    body = q.to_dict()
+    body["aggs"] = {"day": _day_histogram(field, first, last,
+                                          body.pop("aggs", {}))}
+    resp = q.update_from_dict(body).execute()
+    return _by_day(resp.aggregations.to_dict()["day"]["buckets"])
+
+
+def _day_histogram(field, first, last, aggs):
+    return {
+        "date_histogram": {
+            "field": field,
+            "calendar_interval": "1d",
+            "min_doc_count": 0,
+            "extended_bounds": {"min": _epoch_ms(first),
+                                "max": _epoch_ms(last)},
+        },
+        "aggs": aggs,
+    }
+
+
+def _by_day(buckets):
+    return {_epoch + datetime.timedelta(milliseconds=b["key"]): b
+            for b in buckets}
+
+
+def _query_days_composite(s, name, field, first, last):
+    """Page through the composite aggregation `name` of s from first through
+    last with the day added as its first source, and regroup the buckets
+    into one bucket per day, like those of _query_days"""
+    end = last + datetime.timedelta(days=1)
+    q = s.filter("range", **{field: {"gte": first, "lt": end}})
+    body = q.to_dict()
+    composite = body["aggs"][name]["composite"]
+    composite["sources"] = [{"day": {"date_histogram": {
+        "field": field, "calendar_interval": "1d"}}}] + composite["sources"]
+    q = q.update_from_dict(body)
+
+    found = {}
+    day = first
+    while day <= last:
+        found[day] = {"key": _epoch_ms(day), "doc_count": 0,
+                      name: {"buckets": []}}
+        day += datetime.timedelta(days=1)
+    for bucket in composite_buckets(q, name):
+        day = _epoch + datetime.timedelta(milliseconds=bucket["key"].pop("day"))
+        found[day]["doc_count"] += bucket["doc_count"]
+        found[day][name]["buckets"].append(bucket)
+    return found
+
+
+def _query(s, field, first, last):
+    aggs = s.to_dict().get("aggs", {})
+    if len(aggs) == 1:
+        (name, agg), = aggs.items()
+        if "composite" in agg:
+            return _query_days_composite(s, name, field, first, last)
+    return _query_days(s, field, first, last)
+
+
+def daily_buckets(s, starttime, endtime, field="EndTime"):
+    """Return the aggregations of Search s for each day from starttime up to
+    (not including) endtime, as a list of one-day date_histogram bucket dicts.
+
+    The aggregations already on s are nested under each day's bucket, and s
+    should not itself restrict `field`, which is used to split the days.  If
+    s has a single composite aggregation, it is paged through in full, and
+    each day's bucket holds that day's share of its buckets, under the
+    aggregation's name, keyed by the remaining sources.
+    Without a cache path configured, the whole range is queried every time.
+    """
+    days = _day_range(starttime, endtime)
+    if not days:
+        return []
+
+    if _settings["path"] is None:
+        found = _query(s, field, days[0], days[-1])
+        return [found[day] for day in days if day in found]
+
+    fp = fingerprint(s)
+    mutable_from = (datetime.datetime.utcnow().date()
+                    - datetime.timedelta(days=_settings["mutable_days"]))
+    with _connect() as db:
+        rows = db.execute(
+            "SELECT day, bucket FROM daily"
+            " WHERE fingerprint = ? AND day >= ? AND day <= ?",
+            (fp, days[0].isoformat(), days[-1].isoformat()))
+        found = {datetime.date.fromisoformat(day): json.loads(bucket)
+                 for day, bucket in rows}
+
+        missing = [day for day in days
+                   if day not in found or day >= mutable_from]
+        if missing:
+            fetched = _query(s, field, missing[0], missing[-1])
+            now = datetime.datetime.utcnow().isoformat()
+            db.executemany(
+                "INSERT OR REPLACE INTO daily VALUES (?, ?, ?, ?)",
+                [(fp, day.isoformat(), now, json.dumps(bucket))
+                 for day, bucket in fetched.items()])
+            found.update(fetched)
+    db.close()
+
+    return [found[day] for day in days if day in found]
+
+
+def is_cached(s, starttime, endtime, field="EndTime"):
+    """Whether the cache holds every day from starttime up to endtime that
+    daily_buckets(s, ...) would not re-query anyway, so that it would only
+    need to query the recent days"""
+    if _settings["path"] is None:
+        return False
+    mutable_from = (datetime.datetime.utcnow().date()
+                    - datetime.timedelta(days=_settings["mutable_days"]))
+    days = [day for day in _day_range(starttime, endtime) if day < mutable_from]
+    if not days:
+        return True
+    with _connect() as db:
+        (n,), = db.execute(
+            "SELECT COUNT(*) FROM daily"
+            " WHERE fingerprint = ? AND day >= ? AND day <= ?",
+            (fingerprint(s), days[0].isoformat(), days[-1].isoformat()))
+    db.close()
+    return n == len(days)
+
+
+def day_aggregation(s, starttime, endtime, field="EndTime"):
+    """The one-day date_histogram aggregation (a dict) that daily_buckets
+    would run for s, for adding to another search over the same range so
+    that the cache can be filled without a separate request; pass its
+    buckets to save_days"""
+    days = _day_range(starttime, endtime)
+    return _day_histogram(field, days[0], days[-1], s.to_dict().get("aggs", {}))
+
+
+def save_days(s, buckets):
+    """Keep the buckets of a day_aggregation of s in the cache, if enabled"""
+    if _settings["path"] is None:
+        return
+    fp = fingerprint(s)
+    now = datetime.datetime.utcnow().isoformat()
+    with _connect() as db:
+        db.executemany(
+            "INSERT OR REPLACE INTO daily VALUES (?, ?, ?, ?)",
+            [(fp, day.isoformat(), now, json.dumps(bucket))
+             for day, bucket in _by_day(buckets).items()])
+    db.close()
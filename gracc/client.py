@@ -0,0 +1,148 @@
+"""A single, lazily created GRACC (OpenSearch) client for all the tools.
+
+The client keeps a pool of keep-alive connections to GRACC, so the TLS
+handshake is paid once per connection rather than once per query, and
+retries requests that fail with 429/5xx or a connection error, backing off
+exponentially between attempts.
+
+Settings may be overridden with configure() before the first call to
+get_client(), or from the environment:
+
+    GRACC_URL          GRACC endpoint (TLS is used for https:// URLs)
+    GRACC_TIMEOUT      per-request timeout in seconds (default 300)
+    GRACC_MAX_RETRIES  number of retries after the first attempt (default 4)
+    GRACC_BACKOFF      initial backoff in seconds (default 2)
+    GRACC_POOL_SIZE    max pooled connections (default 10)
+    GRACC_QUERY_LOG    where to log the timing of each request (see querylog)
+
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+
+import opensearchpy
+from opensearchpy.exceptions import ConnectionError, SSLError, TransportError
+
+from . import querylog
+
+
+GRACC_URL = "https://gracc.opensciencegrid.org/q"
+
+RETRY_ON_STATUS = (429, 500, 502, 503, 504)
+
+_settings = {
+    "url":         os.environ.get("GRACC_URL", GRACC_URL),
+    "timeout":     float(os.environ.get("GRACC_TIMEOUT", 300)),
+    "max_retries": int(os.environ.get("GRACC_MAX_RETRIES", 4)),
+    "backoff":     float(os.environ.get("GRACC_BACKOFF", 2)),
+    "max_backoff": 120.0,
+    "pool_size":   int(os.environ.get("GRACC_POOL_SIZE", 10)),
+}
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def _is_retryable(err):
+    if isinstance(err, SSLError):
+        return False
+    if isinstance(err, ConnectionError):
+        return True
+    return err.status_code in RETRY_ON_STATUS
+
+
+class SizedConnection(opensearchpy.Urllib3HttpConnection):
+    """Connection that notes the size of each request and response body for
+    the query log"""
+
+    sizes = threading.local()
+
+    def perform_request(self, method, url, params=None, body=None, *args, **kwargs):
+        self.sizes.request = len(body) if body else 0
+        self.sizes.response = None
+        status, headers, data = super().perform_request(method, url, params, body,
+                                                        *args, **kwargs)
+        if querylog.enabled():
+            self.sizes.response = len(data.encode("utf-8", "surrogatepass"))
+        return status, headers, data
+
+
+class RetryTransport(opensearchpy.Transport):
+    """Transport that retries transient failures with exponential backoff,
+    logging each request to the query log"""
+
+    def __init__(self, hosts, backoff=2.0, max_backoff=120.0, **kwargs):
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # we do our own retries (with a delay between them) below
+        self.backoff_retries = kwargs.pop("max_retries", 3)
+        super().__init__(hosts, max_retries=0, **kwargs)
+
+    def perform_request(self, method, url, *args, **kwargs):
+        started = querylog.utcnow()
+        t0 = time.time()
+        attempt = 0
+        while True:
+            try:
+                data = super().perform_request(method, url, *args, **kwargs)
+            except TransportError as err:
+                if attempt >= self.backoff_retries or not _is_retryable(err):
+                    self._log(started, t0, method, url, attempt, err.status_code,
+                              error=str(err))
+                    raise
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+                delay *= random.uniform(0.5, 1.0)
+                attempt += 1
+                print("GRACC request failed (%s), retry %d/%d in %.1fs"
+                      % (err, attempt, self.backoff_retries, delay),
+                      file=sys.stderr)
+                time.sleep(delay)
+            else:
+                self._log(started, t0, method, url, attempt, 200,
+                          **querylog.describe_response(data))
+                return data
+
+    def _log(self, started, t0, method, url, attempt, status, **fields):
+        if not querylog.enabled():
+            return
+        sizes = SizedConnection.sizes
+        querylog.record(time=started, method=method, path=url, status=status,
+                        attempts=attempt + 1,
+                        wall_ms=round((time.time() - t0) * 1000, 1),
+                        request_bytes=getattr(sizes, "request", None),
+                        response_bytes=getattr(sizes, "response", None),
+                        **fields)
+
+
+def configure(**settings):
+    """Override client settings (url, timeout, max_retries, backoff,
+    max_backoff, pool_size).  Must be called before get_client()."""
+    unknown = set(settings) - set(_settings)
+    if unknown:
+        raise TypeError("unknown GRACC client settings: %s"
+                        % ", ".join(sorted(unknown)))
+    if _client is not None:
+        raise RuntimeError("GRACC client already created")
+    _settings.update(settings)
+
+
+def get_client():
+    """Return the shared GRACC client, creating it on first use"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = opensearchpy.OpenSearch(
+                [_settings["url"]],
+                transport_class=RetryTransport,
+                connection_class=SizedConnection,
+                timeout=_settings["timeout"],
+                max_retries=_settings["max_retries"],
+                backoff=_settings["backoff"],
+                max_backoff=_settings["max_backoff"],
+                pool_maxsize=_settings["pool_size"],
+                verify_certs=True,
+            )
+        return _client
@@ -0,0 +1,60 @@
+"""Paging through sorted search results with search_after, and through the
+buckets of composite aggregations with after_key.
+
+Unlike scan(), which keeps a scroll context open on the cluster until every
+hit has been read, search_after issues independent requests, so a caller
+that only needs the first few hits can simply stop iterating and no further
+requests are made.  Composite aggregations page the same way, so that
+grouping by a field with an unknown (and growing) number of values needs
+neither a huge terms size nor a cap that silently drops buckets.
+
+"""
+
+
+def search_after(s, page_size=100, max_page_size=5000):
+    """Yield the hits of the sorted Search `s` one page at a time.
+
+    The sort of `s` must end with a unique tiebreaker so that no hits are
+    skipped or repeated between pages.  It should be a field with doc
+    values, such as the RecordId of raw records: sorting on _id needs
+    fielddata, which the cluster may not allow.  The page size starts at
+    `page_size` and doubles with each request up to `max_page_size`, so
+    short reads stay cheap and long reads take few round trips.
+    """
+    s = s.extra(track_total_hits=False)
+    after = None
+    size = page_size
+    while True:
+        page = s.extra(size=size)
+        if after is not None:
+            page = page.extra(search_after=after)
+        hits = page.execute().hits
+        for hit in hits:
+            yield hit
+        if len(hits) < size:
+            return
+        after = list(hits[-1].meta.sort)
+        size = min(size * 2, max_page_size)
+
+
+def composite_buckets(s, name):
+    """Yield the buckets of the composite aggregation `name` of Search `s`,
+    as dicts, one page at a time.
+
+    The page size is the `size` of the aggregation.  Each request carries on
+    from the after_key of the one before, until a page comes back short.
+    """
+    s = s.extra(size=0, track_total_hits=False)
+    size = s.to_dict()["aggs"][name]["composite"].get("size", 10)
+    after = None
+    while True:
+        page = s.extra()
+        if after is not None:
+            body = page.to_dict()
+            body["aggs"][name]["composite"]["after"] = after
+            page = page.update_from_dict(body)
+        agg = page.execute().aggregations.to_dict()[name]
+        yield from agg["buckets"]
+        after = agg.get("after_key")
+        if len(agg["buckets"]) < size or after is None:
+            return
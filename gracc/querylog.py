@@ -0,0 +1,107 @@
+"""Timing and size records for every GRACC request, as JSON lines.
+
+When a log path is set (with configure() or GRACC_QUERY_LOG), each request
+made through the shared client appends one JSON object to it:
+
+    time        when the request started (UTC)
+    tool        the script that made it
+    label       the instrumented function it was made from (see instrumented)
+    method, path, status, attempts
+    wall_ms     client wall time, including any retries
+    took_ms     the server's own "took" time
+    request_bytes, response_bytes
+    hits        number of hits returned
+    buckets     number of aggregation buckets returned, at all levels
+    error       the error, if the request failed
+
+Several tools may append to the same log at once.
+
+"""
+
+import datetime
+import functools
+import json
+import os
+import sys
+import threading
+
+
+_settings = {
+    "path": os.environ.get("GRACC_QUERY_LOG") or None,
+}
+
+_local = threading.local()
+_write_lock = threading.Lock()
+
+
+def configure(**settings):
+    """Override querylog settings (path)"""
+    unknown = set(settings) - set(_settings)
+    if unknown:
+        raise TypeError("unknown GRACC query log settings: %s"
+                        % ", ".join(sorted(unknown)))
+    _settings.update(settings)
+
+
+def enabled():
+    return _settings["path"] is not None
+
+
+def instrumented(func):
+    """Decorator: label the GRACC requests made (in the same thread) while
+    func runs with its name"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        stack = _local.__dict__.setdefault("labels", [])
+        stack.append(func.__name__)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stack.pop()
+    return wrapper
+
+
+def current_label():
+    stack = getattr(_local, "labels", None)
+    return stack[-1] if stack else None
+
+
+def count_buckets(aggs):
+    """Number of buckets in an aggregations response, at all levels"""
+    n = 0
+    if isinstance(aggs, dict):
+        for key, value in aggs.items():
+            if key == "buckets":
+                buckets = value.values() if isinstance(value, dict) else value
+                for bucket in buckets:
+                    n += 1 + count_buckets(bucket)
+            elif isinstance(value, dict):
+                n += count_buckets(value)
+    return n
+
+
+def record(**fields):
+    """Append a record for one request to the log"""
+    if not enabled():
+        return
+    fields.setdefault("tool", os.path.basename(sys.argv[0]))
+    fields.setdefault("label", current_label())
+    line = json.dumps(fields, sort_keys=True, default=str) + "\n"
+    with _write_lock, open(_settings["path"], "a") as f:
+        f.write(line)
+
+
+def describe_response(data):
+    """The took/hits/buckets fields for a deserialized response body"""
+    if not isinstance(data, dict):
+        return {}
+    hits = data.get("hits", {}).get("hits")
+    return {
+        "took_ms": data.get("took"),
+        "hits": len(hits) if hits is not None else None,
+        "buckets": count_buckets(data.get("aggregations", {})),
+    }
+
+
+def utcnow():
+    return datetime.datetime.utcnow().isoformat(timespec="milliseconds")
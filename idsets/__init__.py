@@ -0,0 +1,12 @@
+"""Set algebra over interned keys, for counting the new and active users of
+a sequence of periods.
+
+Each key (eg, a user's directory) is given a dense integer id once by an
+Interner, and the membership of many periods is a periods x ids NumPy bool
+matrix, so the number of keys in each period and the period in which each
+key was first seen are single vectorized operations instead of loops over
+Python sets.
+
+"""
+
+from .bitmaps import Interner, Periods
@@ -0,0 +1,79 @@
+"""Interned ids, bool masks and period membership matrices"""
+
+import numpy as np
+
+
+class Interner:
+    """Dense integer ids for hashable keys, in order of first appearance"""
+
+    def __init__(self, keys=()):
+        self._ids = {}
+        self._keys = []
+        self.ids(keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def id(self, key):
+        """The id of key, giving it the next free id if it is new"""
+        id = self._ids.get(key)
+        if id is None:
+            id = self._ids[key] = len(self._keys)
+            self._keys.append(key)
+        return id
+
+    def ids(self, keys):
+        """Array of the ids of keys"""
+        return np.fromiter((self.id(key) for key in keys), dtype=np.int64)
+
+    def keys(self, mask):
+        """List of the keys set in mask, in id order"""
+        return [self._keys[id] for id in np.flatnonzero(mask)]
+
+
+class Periods:
+    """
+    Membership of interned keys in a sequence of periods (eg, months), as a
+    periods x ids bool matrix.  The periods are given in time order, as
+    (label, keys) pairs.
+    """
+
+    def __init__(self, periods, interner=None):
+        self.interner = Interner() if interner is None else interner
+        self.labels = []
+        rows = []
+        for label, keys in periods:
+            self.labels.append(label)
+            rows.append(self.interner.ids(keys))
+        self.matrix = np.zeros((len(rows), len(self.interner)), dtype=bool)
+        for i, ids in enumerate(rows):
+            self.matrix[i, ids] = True
+
+    def active(self):
+        """Number of keys in each period"""
+        return self.matrix.sum(axis=1)
+
+    def first_seen(self):
+        """Index of the first period of each id, or -1 for ids in none"""
+        first = self.matrix.argmax(axis=0)
+        first[~self.matrix.any(axis=0)] = -1
+        return first
+
+    def new(self, period):
+        """Mask of the ids first seen in the period with the given index"""
+        if period < 0:
+            period += len(self.labels)
+        return self.first_seen() == period
+
+    def new_counts(self, window=None):
+        """Number of keys first seen in each period, or with window, number of
+        keys of each period not in any of the window periods before it"""
+        if window is None:
+            first = self.first_seen()
+            return np.bincount(first[first >= 0], minlength=len(self.labels))
+        # before[i] counts the periods from i - window up to i that have each id
+        running = np.cumsum(self.matrix, axis=0, dtype=np.int32)
+        before = np.zeros_like(running)
+        before[1:] = running[:-1]
+        before[window + 1:] -= running[:-window - 1]
+        return (self.matrix & (before == 0)).sum(axis=1)
@@ -16,32 +16,25 @@ python3 -m venv venv
 pip install -r requirements.txt
 
 
-# run metrics
+# per-day GRACC aggregation cache (saved between runs by the workflow)
 
-START_DATE=$(date -d "30 days ago" +%F)
-END_DATE=$(date -d yesterday +%F)
+export GRACC_CACHE=${GRACC_CACHE:-$PWD/.cache/gracc.sqlite}
 
-cd campuses-with-active-researchers
-{ ./campuses-with-active-researchers.py --csv $START_DATE $END_DATE
-} > ../campuses-with-active-researchers.csv
 
-cd ../campus-contributions
-{ ./campus-contributions --json $START_DATE $END_DATE
-} > ../campus-contributions.json
+# timing of each GRACC request, one JSON object per line (kept as a workflow
+# artifact, not published)
 
-cd ../osg-cpu-hours
-./osg-cpu-hours.py -o ../osg-cpu-hours.json
+export GRACC_QUERY_LOG=${GRACC_QUERY_LOG:-$PWD/gracc-queries.jsonl}
 
-cd ../osg-project-waittime
-./calculate-waittime.py ../osg-waittime.csv $START_DATE $END_DATE
 
-cd ../software
-./due-date-changes.py -o ../software-due-date-changes.csv
+# run metrics
+
+START_DATE=$(date -d "30 days ago" +%F)
+END_DATE=$(date -d yesterday +%F)
 
-cd ../connect-origin-users
-./connect-origin-users.py -o ../connect-origin-users.json
+# all of the metrics run at the same time; see ./run-metrics.py --help
 
-cd ..
+./run-metrics.py --start-date $START_DATE --end-date $END_DATE
 
 
 # Commit files
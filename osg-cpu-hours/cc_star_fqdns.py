@@ -1,48 +1,26 @@
 #!/usr/bin/env python3
 
-import collections
-import operator
 import sys
 import os
 
-try: 
-    from urllib.request import urlopen 
-except ImportError: 
-    from urllib2 import urlopen 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+import topology
 
-import xml.etree.ElementTree as et
+_topology_host = topology.TOPOLOGY_HOST
+_topology_itb_host = topology.TOPOLOGY_ITB_HOST
 
-_topology_host = "topology.opensciencegrid.org"
-_topology_itb_host = "topology-itb.opensciencegrid.org"
-_rgsummary_url = 'https://{host}/rgsummary/xml'
-_ce_params = [
-    ('gridtype',     'on'),
-    ('gridtype_1',   'on'),
-    ('service',      'on'),
-    ('service_1',    'on')
-]
-_ces_url = "%s?%s" % (_rgsummary_url, '&'.join(map('='.join, _ce_params)))
 
-
-def rg_cc_star_fqdns(rg):
-    return [
-        r.find('FQDN').text
-        for r in rg.find('Resources').findall('Resource')
-        for tag in r.find('Tags').findall('Tag')
-        if tag.text == 'CC*'
-    ]
+def topology_cc_star_fqdns(topo):
+    # CEs in production resource groups with the CC* tag
+    return topo.fqdns(tag='CC*', services='CE', production=True)
 
 
 def get_cc_star_fqdns(xmltxt):
-    xmltree = et.fromstring(xmltxt)
-    return sorted( fqdn for rg in xmltree.findall('ResourceGroup')
-                        for fqdn in rg_cc_star_fqdns(rg) )
+    return topology_cc_star_fqdns(topology.parse(xmltxt))
 
 
 def get_cc_star_fqdns_from(host):
-    ces_url = _ces_url.replace("{host}", host, 1)
-    xmltxt = urlopen(ces_url).read()
-    return get_cc_star_fqdns(xmltxt)
+    return topology_cc_star_fqdns(topology.get_topology(host))
 
 
 def get_cc_star_fqdns_prod():
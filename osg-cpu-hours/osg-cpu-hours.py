@@ -5,21 +5,24 @@
 # generates various Core Hours metrics including those in the dashboard panels
 # at the bottom of https://gracc.opensciencegrid.org/
 
+import os
 import re
 import sys
 import json
 import time
+import operator
 import datetime
+import argparse
+import functools
 import collections
-import opensearchpy
 from opensearchpy import Search, A, Q
 
 import cc_star_fqdns
 
-gracc_url = 'https://gracc.opensciencegrid.org/q'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+import gracc
 
-es = opensearchpy.OpenSearch(
-                [gracc_url], timeout=300, use_ssl=True, verify_certs=True)
+es = gracc.get_client()
 
 jobs_raw_index = 'gracc.osg.raw-*'
 jobs_summary_index = 'gracc.osg.summary'
@@ -72,6 +75,7 @@ cc_star_usage = (
 )
 
 
+@gracc.instrumented
 def cpu_hours_for_window_filters(days, extra_filters, want_fqdns=False):
     s = Search(using=es, index=jobs_summary_index)
     #endtime = datetime.datetime.now() - datetime.timedelta(1)
@@ -113,6 +117,139 @@ def get_panel_row(extra_filters, want_fqdns=False):
     hours, count, fqdns = zip(*map(cpu_hours_for_window, windows))
     return HoursCount(list(map("{:,}".format, hours)), count, fqdns)
 
+
+# single-request engine: one search with a date_range aggregation over the
+# windows, and a filters aggregation keyed by panel name inside each window.
+# With the gracc cache enabled, the per-day CoreHours sums of the panels are
+# also kept there, so once it is warm only the FQDN panels' counts and lists
+# are aggregated over the whole windows
+
+_windows = [1, 30, 365]
+
+
+def panel_filters():
+    panels = dict(
+        osg_connect = osg_connect,
+        multi_inst  = multi_inst,
+        campus_orgs = campus_orgs,
+        gpu_usage   = gpu_usage,
+        all_non_lhc = osg_connect | multi_inst | campus_orgs,
+    )
+    fqdn_panels = dict(
+        amnh_usage        = amnh_usage,
+        cc_star_usage     = cc_star_usage,
+        cc_star_gpu_usage = cc_star_gpu_usage,
+    )
+    return panels, fqdn_panels
+
+
+@gracc.instrumented
+def get_panel_rows(panels, fqdn_panels, windows=_windows):
+    endtime = datetime.datetime.date(datetime.datetime.now()) # midnight today
+    starttime = endtime - datetime.timedelta(max(windows))
+    ranges = [ {'key': str(d), 'from': endtime - datetime.timedelta(d),
+                               'to': endtime}
+               for d in windows ]
+
+    # per-day CoreHours of every panel, as kept in the gracc cache
+    any_panel = functools.reduce(operator.or_,
+                                 list(panels.values()) + list(fqdn_panels.values()))
+    sums = Search(using=es, index=jobs_summary_index)
+    sums = sums.query('bool', filter=[any_panel])
+    sums.aggs.bucket('Panels', 'filters', filters=panels) \
+             .metric('CoreHours', 'sum', field='CoreHours')
+    sums.aggs.bucket('FQDNPanels', 'filters', filters=fqdn_panels) \
+             .metric('CoreHours', 'sum', field='CoreHours')
+    warm = gracc.is_cached(sums, starttime, endtime, field='EndTime')
+
+    any_fqdn_panel = functools.reduce(operator.or_, fqdn_panels.values())
+    filters = (
+            Q('range', EndTime={'gte': starttime, 'lt': endtime })
+         &  (any_fqdn_panel if warm else any_panel)
+    )
+    s = Search(using=es, index=jobs_summary_index)
+    s = s.query('bool', filter=[filters])
+    s = s.extra(size=0)
+
+    win = s.aggs.bucket('Windows', 'date_range', field='EndTime',
+                        keyed=True, ranges=ranges)
+    if not warm:
+        win.bucket('Panels', 'filters', filters=panels) \
+           .metric('CoreHours',  'sum',         field='CoreHours')
+    fbkt = win.bucket('FQDNPanels', 'filters', filters=fqdn_panels)
+    if not warm:
+        fbkt.metric('CoreHours',  'sum',         field='CoreHours')
+    fbkt.metric('FQDN_count', 'cardinality', field='OIM_FQDN')
+    fbkt.bucket('FQDNs',     'terms', field='OIM_FQDN',     size=1000) \
+        .bucket('Resources', 'terms', field='OIM_Resource', size=1000)
+    if not warm and gracc.cache.enabled():
+        # fill the cache from this same request
+        s.aggs.bucket('Days', A(gracc.day_aggregation(sums, starttime, endtime,
+                                                      field='EndTime')))
+
+    resp = s.execute()
+    windows_aggs = resp.aggregations.Windows.buckets
+
+    if warm:
+        days = gracc.daily_buckets(sums, starttime, endtime, field='EndTime')
+        def corehours(agg, name, d):
+            return sum(day[agg]['buckets'][name]['CoreHours']['value']
+                       for day in days[-d:])
+    else:
+        if gracc.cache.enabled():
+            gracc.save_days(sums, resp.aggregations.Days.to_dict()['buckets'])
+        def corehours(agg, name, d):
+            return windows_aggs[str(d)][agg].buckets[name].CoreHours.value
+
+    def window_values(name, want_fqdns):
+        agg = 'FQDNPanels' if want_fqdns else 'Panels'
+        for d in windows:
+            if want_fqdns:
+                b = windows_aggs[str(d)][agg].buckets[name]
+                fqdns = sorted( "%s (%s)" % (resource.key, fqdn.key)
+                                for fqdn in b.FQDNs.buckets
+                                for resource in fqdn.Resources.buckets )
+                count = b.FQDN_count.value
+            else:
+                # FQDN counts are only reported for the panels that list FQDNs
+                fqdns = []
+                count = None
+            yield int(corehours(agg, name, d)), count, fqdns
+
+    rows = {}
+    for name in panels:
+        hours, count, fqdns = zip(*window_values(name, False))
+        rows[name] = HoursCount(list(map("{:,}".format, hours)), count, fqdns)
+    for name in fqdn_panels:
+        hours, count, fqdns = zip(*window_values(name, True))
+        rows[name] = HoursCount(list(map("{:,}".format, hours)), count, fqdns)
+    return rows
+
+
+def m2_single():
+    rows = get_panel_rows(*panel_filters())
+    amnh        = rows['amnh_usage']
+    cc_star     = rows['cc_star_usage']
+    cc_star_gpu = rows['cc_star_gpu_usage']
+
+    return dict(
+        osg_connect = rows['osg_connect'].hours,
+        multi_inst  = rows['multi_inst'].hours,
+        campus_orgs = rows['campus_orgs'].hours,
+        gpu_usage   = rows['gpu_usage'].hours,
+        all_non_lhc = rows['all_non_lhc'].hours,
+        amnh_usage  = amnh.hours,
+        amnh_count  = amnh.count,
+        amnh_fqdns  = amnh.fqdns,
+        cc_star_usage = cc_star.hours,
+        cc_star_count = cc_star.count,
+        cc_star_fqdns = cc_star.fqdns,
+        cc_star_gpu_usage = cc_star_gpu.hours,
+        cc_star_gpu_count = cc_star_gpu.count,
+        cc_star_gpu_fqdns = cc_star_gpu.fqdns,
+    )
+
+
 def m2():
     amnh        = get_panel_row(amnh_usage, want_fqdns=True)
     cc_star     = get_panel_row(cc_star_usage, want_fqdns=True)
@@ -138,17 +275,29 @@ def m2():
     )
 
 
+def parse_args(args):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-o", dest="outfile", help="Output file")
+    parser.add_argument("--engine", choices=["single", "per-window"],
+                        default="single",
+                        help="Query all panels and windows in a single search "
+                             "(default), or one search per panel and window")
+    return parser.parse_args(args)
+
+
 def main(args):
+    args = parse_args(args)
     unix_ts = int(time.time())
     human_ts = time.strftime("%F %H:%M", time.localtime(unix_ts))
+    metrics = m2_single() if args.engine == "single" else m2()
     data = dict(
         last_update = unix_ts,
         last_update_str = human_ts,
-        **m2()
+        **metrics
     )
 
-    if len(args) == 2 and args[0] == '-o':
-        out = open(args[1], "w")
+    if args.outfile:
+        out = open(args.outfile, "w")
     else:
         out = sys.stdout
 
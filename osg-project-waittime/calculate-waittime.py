@@ -1,15 +1,20 @@
 #!/usr/bin/env python3
 
-import opensearchpy
 from opensearchpy import Search, A, Q
 import datetime
+import os
+import sys
+import numpy as np
 import pandas as pd
 import dateutil.parser as parser
 import argparse
 import collections
+import concurrent.futures
+import math
 import statistics
 
-GRACC = "https://gracc.opensciencegrid.org/q"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+import gracc
 
 HOUR = 3600
 MINUTE = 60
@@ -17,6 +22,7 @@ MINUTE = 60
 # A mapping of usernames to projects
 usernameToProject = collections.defaultdict(set)
 
+@gracc.instrumented
 def getUsersPerDay(starttime: datetime.datetime, endtime: datetime.datetime):
     """
     Get a table of user's usage by day.  The table will have the format:
@@ -28,22 +34,16 @@ def getUsersPerDay(starttime: datetime.datetime, endtime: datetime.datetime):
 
     # 6 months back
     starttime = starttime - datetime.timedelta(days=15)
-    es = opensearchpy.OpenSearch(
-        [GRACC],
-        timeout=300,
-        use_ssl=True,
-        verify_certs=True
-    )
+    es = gracc.get_client()
 
-    MAXSZ = 2 ** 30
     index = "gracc.osg.summary"
     s = Search(using=es, index=index)
     # Starttime and endtime are both datetime objects
+    # The EndTime range is applied per day by gracc.daily_buckets
     s = s.query(
         "bool",
         filter=[
-            Q("range", EndTime={"gte": starttime, "lt": endtime})
-            & Q("term", ResourceType="Payload")
+            Q("term", ResourceType="Payload")
             & Q("term", VOName="osg")
             & (Q("term", ProbeName="condor-ap:login04.osgconnect.net") | 
                Q("term", ProbeName="condor-ap:login05.osgconnect.net") |
@@ -59,32 +59,55 @@ def getUsersPerDay(starttime: datetime.datetime, endtime: datetime.datetime):
         ],
     )
 
-    bkt = s.aggs
-    bkt = bkt.bucket("EndTime", A('date_histogram', field="EndTime", calendar_interval="1d"))
-    bkt = bkt.bucket("DN", A("terms", size=MAXSZ, field="DN"))
-    bkt = bkt.bucket("ProjectName", A("terms", size=MAXSZ, field="ProjectName"))
+    bkt = s.aggs.bucket("UserProject", "composite", size=10000, sources=[
+        {"DN": {"terms": {"field": "DN"}}},
+        {"ProjectName": {"terms": {"field": "ProjectName"}}},
+    ])
     bkt.metric("CoreHours", 'sum', field="CoreHours", missing=0)
 
-    response = s.execute()
+    buckets = gracc.daily_buckets(s, starttime, endtime, field="EndTime")
+
+    # Like a plain date_histogram, start and end with the first and last days with usage
+    withUsage = [i for i, bucket in enumerate(buckets) if bucket["doc_count"]]
+    if withUsage:
+        buckets = buckets[withUsage[0]:withUsage[-1] + 1]
+    else:
+        buckets = []
+
+    return decodeUsersPerDay(buckets)
 
-    results_dict = {}
-    for bucket in response.aggregations["EndTime"]["buckets"]:
-        date = bucket["key"]
-        results_dict[date] = {}
-        for user in bucket['DN']['buckets']:
-            username = user['key']
-            for project in user['ProjectName']['buckets']:
-                usernameToProject[username].add(project['key'])
-                results_dict[date][username] = project['CoreHours']['value']
-        #print(bucket.to_dict())
 
-    df = pd.DataFrame(results_dict)
-    df = df.fillna(0)
-    df.columns = pd.to_datetime([x*1000000 for x in df.columns])
-    return df
-    #print(response.aggregations.to_dict())
+def decodeUsersPerDay(buckets):
+    """
+    Decode the per-day (DN, ProjectName) composite aggregation buckets into the
+    users x days CoreHours table returned by getUsersPerDay.
+
+    The (user, day, CoreHours) entries are read into preallocated arrays, then
+    scattered into a float32 matrix, with a user's usage across several projects
+    on the same day summed.  The projects of each user are recorded in
+    usernameToProject.
+    """
+    nentries = sum(len(bucket['UserProject']['buckets']) for bucket in buckets)
+    userIdx = np.empty(nentries, dtype=np.int32)
+    dayIdx = np.empty(nentries, dtype=np.int32)
+    coreHours = np.zeros(nentries, dtype=np.float32)
+
+    users = {}  # username -> row, in order of first appearance
+    i = 0
+    for day, bucket in enumerate(buckets):
+        for entry in bucket['UserProject']['buckets']:
+            username = entry['key']['DN']
+            usernameToProject[username].add(entry['key']['ProjectName'])
+            userIdx[i] = users.setdefault(username, len(users))
+            dayIdx[i] = day
+            coreHours[i] = entry['CoreHours']['value']
+            i += 1
+
+    usage = np.zeros((len(users), len(buckets)), dtype=np.float32)
+    np.add.at(usage, (userIdx, dayIdx), coreHours)
+    days = pd.to_datetime([bucket['key'] for bucket in buckets], unit="ms")
+    return pd.DataFrame(usage, index=list(users), columns=days)
 
-    #return {f["key"] for f in response.aggregations["Organization"]["buckets"]}
 
 class UserAttributes:
     def __init__(self):
@@ -99,52 +122,196 @@ class UserAttributes:
         self.username = ""
         self.maxqueue = 0
         self.std = 0
-        self.quantiles = []
+        self.p90 = 0
 
 def getIdleUsers(perDay: pd.DataFrame):
     """
     Find the users that had more than 14 days of 0 usage before 1000 hours of usage.
 
+    Zero days are counted from the start of the period, or from the end of the
+    previous reactivation found for the user; once more than 14 have been seen,
+    usage is accumulated until it reaches 1000 hours, which marks a reactivation
+    and resets both counters.
+
+    The search runs over the whole users x days matrix at once, with one pass
+    per reactivation found for any user (usually only a handful).
+
     returns: list(UserAttributes)
     """
+    usage = perDay.to_numpy()
+    days = perDay.columns
+    nusers, ndays = usage.shape
+    dayIndex = np.arange(ndays)
+    isZero = usage == 0
+
+    found = []  # (user row, end day, idle days, start day)
+    segStart = np.zeros(nusers, dtype=int)  # first day since the last reset
+    active = np.arange(nusers)
+    while active.size:
+        # Only look at the days from the earliest segment start onwards
+        first = segStart[active].min()
+        inSegment = dayIndex[first:] >= segStart[active, None]
+        zeros = isZero[active, first:]
+        # Number of zero days since the last reset, as of each day
+        numZeros = np.cumsum(zeros & inSegment, axis=1)
+        # Days with sudden usage after more than 2 weeks of no usage
+        counted = inSegment & ~zeros & (numZeros > 14)
+        tempUsage = np.cumsum(np.where(counted, usage[active, first:], 0), axis=1, dtype=float)
+        reached = counted & (tempUsage >= 1000)
+
+        hasReached = reached.any(axis=1)
+        active = active[hasReached]
+        rows = np.flatnonzero(hasReached)
+        endDay = reached[rows].argmax(axis=1)
+        startDay = counted[rows].argmax(axis=1)
+        idleDays = numZeros[rows, endDay]
+        found.extend(zip(active, first + endDay, idleDays, first + startDay))
+        segStart[active] = first + endDay + 1
+        active = active[segStart[active] < ndays]
+
     user_days = []
-    # Loop through each row (person), searching for 2 weeks (14 days) of 0's, then some usage.
-    for user, row in perDay.iterrows():
-        numZeros = 0
-        tempUsage = 0
-        days = []
-        # For each day in the search period
-        for day, value in row.iteritems():
-            if value == 0:
-                numZeros += 1
-            elif numZeros > 14:
-                # Found sudden usage after more than 2 weeks of no usage
-                
-                tempUsage += value
-                days.append(day)
-                if tempUsage >= 1000:
-                    userAttr = UserAttributes()
-                    userAttr.username = user
-                    userAttr.idledays = numZeros
-                    userAttr.starttime = days[0]
-                    userAttr.endtime = days[-1]
-                    user_days.append(userAttr)
-                    tempUsage = 0
-                    numZeros = 0
-                    days = []
-        
+    for row, endDay, idleDays, startDay in sorted(found):
+        userAttr = UserAttributes()
+        userAttr.username = perDay.index[row]
+        userAttr.idledays = int(idleDays)
+        userAttr.starttime = days[startDay]
+        userAttr.endtime = days[endDay]
+        user_days.append(userAttr)
+
     return user_days
 
+_epoch = datetime.datetime(1970, 1, 1)
+
+
+def parseTimestamp(timestamp):
+    """
+    Parse a GRACC timestamp such as 2023-03-01T12:34:56Z or
+    2023-03-01T12:34:56.000Z to seconds since the epoch (UTC), falling back
+    to dateutil for anything not in that fixed format.
+    """
+    try:
+        parsed = datetime.datetime.fromisoformat(timestamp[:-1] if timestamp.endswith("Z") else timestamp)
+    except ValueError:
+        parsed = parser.parse(timestamp)
+    if parsed.tzinfo is not None:
+        return parsed.timestamp()
+    return (parsed - _epoch).total_seconds()
+
+
+class P2Quantile:
+    """
+    Streaming estimate of a single quantile with the P-squared algorithm
+    (Jain and Chlamtac, 1985): five markers whose heights are adjusted with
+    piecewise-parabolic interpolation as each value is added, so the memory
+    and time per value are constant.
+
+    The first `exact` values are kept as they are, and the quantile of those
+    is exact (as statistics.quantiles); once there are more, the markers
+    start from the sorted values kept so far.
+    """
+    def __init__(self, p, exact=500):
+        self.p = p
+        self.exact = max(exact, 5)
+        self.values = []
+        self.heights = None
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def _start(self):
+        values = sorted(self.values)
+        count = len(values)
+        self.desired = [1 + (count - 1) * f for f in self.increments]
+        self.positions = [int(round(d)) for d in self.desired]
+        self.heights = [values[n - 1] for n in self.positions]
+        self.values = None
+
+    def add(self, x):
+        if self.heights is None:
+            self.values.append(x)
+            if len(self.values) > self.exact:
+                self._start()
+            return
+        q = self.heights
+        n = self.positions
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                # Parabolic prediction, or linear if that would leave the markers out of order
+                h = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < h < q[i + 1]:
+                    h = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = h
+                n[i] += d
+
+    def value(self):
+        if self.heights is None:
+            if len(self.values) < 2:
+                return self.values[0]
+            return statistics.quantiles(self.values, n=100)[round(self.p * 100) - 1]
+        return self.heights[2]
+
+
+class QueueTimeStats:
+    """
+    Running count, mean, standard deviation (Welford), maximum and 90th
+    percentile (P-squared) of a user's queue times, in constant memory.
+    """
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.max = -math.inf
+        self.p90 = P2Quantile(0.9)
+
+    def add(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+        if x > self.max:
+            self.max = x
+        self.p90.add(x)
+
+    def addSummary(self, count, total, sumOfSquares, maximum):
+        """Add count values with the given sum, sum of squares and maximum (Chan et al.)"""
+        if not count:
+            return
+        mean = total / count
+        m2 = max(sumOfSquares - total * mean, 0.0)
+        n = self.n + count
+        delta = mean - self.mean
+        self.m2 += m2 + delta * delta * self.n * count / n
+        self.mean += delta * count / n
+        self.n = n
+        if maximum > self.max:
+            self.max = maximum
+
+    def stdev(self):
+        """Sample standard deviation, as statistics.stdev"""
+        return math.sqrt(self.m2 / (self.n - 1))
+
+
 def generateRawQuery(user, starttime, endtime):
     """
     Generate the raw query to get all usage for a user between starttime and endtime.
     """
-    es = opensearchpy.OpenSearch(
-        [GRACC],
-        timeout=300,
-        use_ssl=True,
-        verify_certs=True
-    )
+    es = gracc.get_client()
     endtime = endtime + datetime.timedelta(days=1)
     MAXSZ = 2 ** 30
     index = "gracc.osg.raw*"
@@ -159,52 +326,270 @@ def generateRawQuery(user, starttime, endtime):
             & Q("term", DN=user) 
         ],
     )
-    s = s.sort("StartTime")
+    # RecordId (a keyword, so it has doc values, unlike _id) breaks ties between
+    # records with the same StartTime, for search_after
+    s = s.sort("StartTime", "RecordId")
+    s = s.source(["StartTime", "EndTime", "QueueTime", "WallDuration", "CoreHours"])
     #print(s.to_dict())
     return s
 
 
 
 
-def getQueueTimes(users):
+def addRecord(userAttr, record):
+    """
+    Add one raw job record to the totals of userAttr, returning its time in queue
+    """
+    userAttr.njobs += 1
+    userAttr.walltime += record['WallDuration']
+    userAttr.corehours += record['CoreHours']
+    queuetime = 0
+    if 'QueueTime' in record:
+        queuetime = (parseTimestamp(record['EndTime']) - parseTimestamp(record['QueueTime'])) - record['WallDuration']
+        userAttr.queuetime += queuetime
+    else:
+        print("QueueTime not found when it should be for probe:{}")
+    return queuetime
+
+
+@gracc.instrumented
+def getUserQueueTime(userAttr):
+    """
+    Scan the raw usage of a single user for the first 1000 hours during the interesting "days",
+    filling in the queue time statistics of userAttr.
+
+    returns: True if 1000 hours were found
+    """
+    found1000 = False
+    s = generateRawQuery(userAttr.username, userAttr.starttime, userAttr.endtime)
+    stats = QueueTimeStats()
+    # Stops requesting pages from GRACC as soon as we break out of the loop
+    for record in gracc.search_after(s):
+        stats.add(addRecord(userAttr, record))
+        # check if we have 1000 hours
+        if userAttr.corehours > 1000:
+            found1000 = True
+            userAttr.maxqueue = stats.max
+            if (userAttr.njobs > 1):
+                userAttr.std = stats.stdev()
+                userAttr.p90 = stats.p90.value()
+            break
+    return found1000
+
+
+def getQueueTimes(users, workers=1):
     """
     Loop through the raw usage to find the first 1000 hours during the interesting "days" for each user.
     Calculate the average time in queue as (EndTime - QueueTime) - WallTime
+
+    Up to `workers` users are scanned concurrently; the results are reported in the order of `users`.
+    """
+    # QueueTime is not available in the raw records before 2021-03-09
+    queried = [userAttr for userAttr in users
+               if userAttr.starttime >= parser.parse("2021-03-09")]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for userAttr, found1000 in zip(queried, executor.map(getUserQueueTime, queried)):
+            reportUser(userAttr, found1000)
+
+    return users
+
+
+def reportUser(userAttr, found1000):
+    if found1000:
+        print("Found the user: {} with QueueTime (hours): {} for CoreHours: {}".format(userAttr.username, userAttr.queuetime/HOUR, userAttr.corehours))
+    else:
+        print("Did not find 1000 hours in {} jobs of usage for user: {} in set of days: {}-{}".format(userAttr.njobs, userAttr.username, userAttr.starttime, userAttr.endtime))
+
+
+# Batch engine: the usage of all the users is aggregated by user and day (of StartTime) on
+# the server, with the queue time of each record computed by a script; only the day on which
+# a user's usage passes 1000 hours is then scanned record by record, and the 90th percentile
+# of the records up to that point is aggregated on the server again.
+
+QUEUETIME_SCRIPT = (
+    "doc['QueueTime'].size() == 0 ? 0 : "
+    "(doc['EndTime'].value.toInstant().toEpochMilli() - doc['QueueTime'].value.toInstant().toEpochMilli()) / 1000.0"
+    " - doc['WallDuration'].value"
+)
+# Users per request: each user adds clauses to the query, which must stay well under the
+# cluster's indices.query.bool.max_clause_count (1024 by default)
+BATCH_USERS = 200
+# The percentile requests have five clauses per user instead of two
+PERCENTILE_USERS = 100
+
+
+def generateBatchQuery(users):
     """
-    # Create a mapping of user to userAttributes
-    userAttrDict = {}
+    Generate the composite aggregation of the raw usage of users (each at most once) by
+    user and day, over each user's own interesting days.
+    """
+    es = gracc.get_client()
+    index = "gracc.osg.raw*"
+    s = Search(using=es, index=index)
+    windows = [
+        Q("term", DN=userAttr.username)
+        & Q("range", EndTime={"gte": userAttr.starttime, "lt": userAttr.endtime + datetime.timedelta(days=1)})
+        for userAttr in users
+    ]
+    s = s.query(
+        "bool",
+        filter=[
+            Q("term", ResourceType="Payload")
+            & Q("bool", should=windows, minimum_should_match=1)
+        ],
+    )
+    script = {"source": QUEUETIME_SCRIPT, "lang": "painless"}
+    bkt = s.aggs.bucket("UserDay", "composite", size=1000, sources=[
+        {"DN": {"terms": {"field": "DN"}}},
+        {"day": {"date_histogram": {"field": "StartTime", "calendar_interval": "1d"}}},
+    ])
+    bkt.metric("CoreHours", "sum", field="CoreHours")
+    bkt.metric("WallDuration", "sum", field="WallDuration")
+    bkt.metric("QueueTime", "extended_stats", script=script)
+    return s
+
+
+def generatePercentileQuery(cutoffs):
+    """
+    Generate the composite aggregation of the 90th percentile of the queue times of each user,
+    over the records of the user's window up to and including the last one counted, in the
+    (StartTime, RecordId) order of generateRawQuery.
+
+    cutoffs: [(userAttr, sort values of the last record counted)], each user at most once
+    """
+    es = gracc.get_client()
+    index = "gracc.osg.raw*"
+    s = Search(using=es, index=index)
+    windows = [
+        Q("term", DN=userAttr.username)
+        & Q("range", EndTime={"gte": userAttr.starttime, "lt": userAttr.endtime + datetime.timedelta(days=1)})
+        & (Q("range", StartTime={"lt": startTime, "format": "epoch_millis"})
+           | (Q("range", StartTime={"gte": startTime, "lte": startTime, "format": "epoch_millis"})
+              & Q("range", RecordId={"lte": recordId})))
+        for userAttr, (startTime, recordId) in cutoffs
+    ]
+    s = s.query(
+        "bool",
+        filter=[
+            Q("term", ResourceType="Payload")
+            & Q("bool", should=windows, minimum_should_match=1)
+        ],
+    )
+    script = {"source": QUEUETIME_SCRIPT, "lang": "painless"}
+    bkt = s.aggs.bucket("User", "composite", size=1000, sources=[
+        {"DN": {"terms": {"field": "DN"}}},
+    ])
+    bkt.metric("QueueTimePercentiles", "percentiles", script=script, percents=[90])
+    return s
+
+
+@gracc.instrumented
+def getBoundaryQueueTimes(userAttr, day, stats):
+    """
+    Scan the raw usage of userAttr on the given day (of StartTime), on which its usage passes
+    1000 hours, up to that point.
+
+    returns: the sort values of the record that passed 1000 hours, or None if none did
+    """
+    s = generateRawQuery(userAttr.username, userAttr.starttime, userAttr.endtime)
+    s = s.filter("range", StartTime={"gte": day, "lt": day + datetime.timedelta(days=1)})
+    for record in gracc.search_after(s):
+        stats.add(addRecord(userAttr, record))
+        if userAttr.corehours > 1000:
+            userAttr.maxqueue = stats.max
+            if (userAttr.njobs > 1):
+                userAttr.std = stats.stdev()
+            return list(record.meta.sort)
+    return None
+
+
+@gracc.instrumented
+def getUserDays(users):
+    """
+    Aggregate the usage of users (each at most once) by user and day
+
+    returns: {username: [user-day composite buckets in day order]}
+    """
+    userDays = collections.defaultdict(list)
+    for bucket in gracc.composite_buckets(generateBatchQuery(users), "UserDay"):
+        userDays[bucket["key"]["DN"]].append(bucket)
+    return userDays
+
+
+@gracc.instrumented
+def getUserPercentiles(cutoffs):
+    """
+    Aggregate the 90th percentile of the queue times of each user up to its cutoff
+
+    returns: {username: 90th percentile}
+    """
+    return {bucket["key"]["DN"]: bucket["QueueTimePercentiles"]["values"]["90.0"]
+            for bucket in gracc.composite_buckets(generatePercentileQuery(cutoffs), "User")}
+
+
+def userRounds(users, size):
+    """
+    Split users into rounds of at most size users, {username: userAttr}, so that each round
+    has one window per user; users with several reactivations go in separate rounds.
+    """
+    rounds = []
     for userAttr in users:
-        if userAttr.starttime < parser.parse("2021-03-09"):
-            #print("Before QueueTime available")
-            continue
-        found1000 = False
-        s = generateRawQuery(userAttr.username, userAttr.starttime, userAttr.endtime)
-        s = s.params(preserve_order=True)
-        queuetimes = []
-        for record in s.scan():
-            userAttr.njobs += 1
-            userAttr.walltime += record['WallDuration']
-            userAttr.corehours += record['CoreHours']
-            queuetime = 0
-            if 'QueueTime' in record:
-                queuetime = (parser.parse(record['EndTime']).timestamp() - parser.parse(record['QueueTime']).timestamp()) - record['WallDuration']
-                userAttr.queuetime += queuetime
-            else:
-                print("QueueTime not found when it should be for probe:{}")
-
-            queuetimes.append(queuetime)
-            # check if we have 1000 hours
-            if userAttr.corehours > 1000:
-                found1000 = True
-                userAttr.maxqueue = max(queuetimes)
-                if (userAttr.njobs > 1):
-                    userAttr.std = statistics.stdev(queuetimes)
-                    userAttr.quantiles = statistics.quantiles(queuetimes, n=10)
+        for batch in rounds:
+            if userAttr.username not in batch and len(batch) < size:
+                batch[userAttr.username] = userAttr
                 break
-        if found1000:
-            print("Found the user: {} with QueueTime (hours): {} for CoreHours: {}".format(userAttr.username, userAttr.queuetime/HOUR, userAttr.corehours))
         else:
-            print("Did not find 1000 hours in {} jobs of usage for user: {} in set of days: {}-{}".format(userAttr.njobs, userAttr.username, userAttr.starttime, userAttr.endtime))
+            rounds.append({userAttr.username: userAttr})
+    return rounds
+
+
+def getQueueTimesBatch(users, workers=1):
+    """
+    Like getQueueTimes, but with the usage of all the users aggregated by user and day on the
+    server, and only the day on which a user passes 1000 hours scanned record by record.
+
+    The totals, maximum and standard deviation are the same as getQueueTimes'.  The 90th
+    percentile is aggregated on the server over the same records, so it is the cluster's
+    (t-digest) estimate rather than getQueueTimes' streaming one.
+    """
+    # QueueTime is not available in the raw records before 2021-03-09
+    queried = [userAttr for userAttr in users
+               if userAttr.starttime >= parser.parse("2021-03-09")]
+
+    boundaries = []  # (userAttr, boundary day, stats)
+    for batch in userRounds(queried, BATCH_USERS):
+        for username, days in getUserDays(list(batch.values())).items():
+            userAttr = batch[username]
+            stats = QueueTimeStats()
+            for bucket in days:
+                if userAttr.corehours + bucket["CoreHours"]["value"] > 1000:
+                    day = datetime.datetime.utcfromtimestamp(bucket["key"]["day"] / 1000)
+                    boundaries.append((userAttr, day, stats))
+                    break
+                queue = bucket["QueueTime"]
+                userAttr.njobs += bucket["doc_count"]
+                userAttr.walltime += bucket["WallDuration"]["value"]
+                userAttr.corehours += bucket["CoreHours"]["value"]
+                userAttr.queuetime += queue["sum"]
+                stats.addSummary(queue["count"], queue["sum"], queue["sum_of_squares"], queue["max"])
+
+    cutoffs = {}  # id(userAttr) -> sort values of the record that passed 1000 hours
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {id(b[0]): executor.submit(getBoundaryQueueTimes, *b) for b in boundaries}
+        for userAttr in queried:
+            future = futures.get(id(userAttr))
+            cutoff = future.result() if future is not None else None
+            if cutoff is not None:
+                cutoffs[id(userAttr)] = cutoff
+            reportUser(userAttr, cutoff is not None)
+
+    # As getQueueTimes, the 90th percentile is only filled in for users with 1000 hours in more than one job
+    wanted = [userAttr for userAttr in queried if id(userAttr) in cutoffs and userAttr.njobs > 1]
+    for batch in userRounds(wanted, PERCENTILE_USERS):
+        percentiles = getUserPercentiles([(userAttr, cutoffs[id(userAttr)]) for userAttr in batch.values()])
+        for username, userAttr in batch.items():
+            userAttr.p90 = percentiles[username]
 
     return users
 
@@ -216,6 +601,11 @@ def add_args():
     argsparser.add_argument("outputfile", type=str, help="Output File")
     argsparser.add_argument("starttime", type=str, help="Start Time, for example 2021-03-01")
     argsparser.add_argument("endtime", type=str, help="End Time, for example 2021-03-31")
+    argsparser.add_argument("--workers", type=int, default=4, help="Number of users to scan concurrently (default: %(default)s)")
+    argsparser.add_argument("--engine", choices=["scan", "batch"], default="scan",
+                            help="scan: read each user's records until 1000 hours; "
+                                 "batch: aggregate all users by day, reading records only on the day 1000 hours are reached "
+                                 "(default: %(default)s)")
     return argsparser
 
 def main():
@@ -225,6 +615,10 @@ def main():
     startDatetime = parser.parse(args.starttime)
     endDatetime = parser.parse(args.endtime)
 
+    if args.workers < 1:
+        argsparser.error("--workers must be at least 1")
+    gracc.configure(pool_size=max(args.workers, 10))
+
     # Find all user with any usage in the last 1 month
     perDay = getUsersPerDay(startDatetime, endDatetime)
 
@@ -232,7 +626,10 @@ def main():
     users = getIdleUsers(perDay)
 
     # Queue times
-    queueTimes = getQueueTimes(users)
+    if args.engine == "batch":
+        queueTimes = getQueueTimesBatch(users, args.workers)
+    else:
+        queueTimes = getQueueTimes(users, args.workers)
     columnNames = ["Username", 
                    "ProjectName", 
                    "Start Time", 
@@ -256,7 +653,7 @@ def main():
                      userAttr.maxqueue/MINUTE, 
                      (userAttr.queuetime/userAttr.njobs)/MINUTE,  # "Average Minutes In Queue", 
                      userAttr.std / MINUTE, # "Standard Deviation in Minutes"
-                     userAttr.quantiles[8]/MINUTE if userAttr.njobs > 1 else 0,  # "90% Queue Time in Minutes"
+                     userAttr.p90/MINUTE if userAttr.njobs > 1 else 0,  # "90% Queue Time in Minutes"
                      userAttr.corehours, 
                      userAttr.njobs]
     
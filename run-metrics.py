@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""Run the nightly metrics tools in parallel
+
+Each tool runs as a subprocess in its own directory, with a timeout and a
+number of retries.  A tool's output file is only put in place once the tool
+succeeds, so a failed or timed-out run never leaves a partial output file.
+The tools' messages are collected and printed one tool after another at the
+end, followed by a summary of the wall time and exit status of each tool;
+the exit status is non-zero if any tool failed.
+
+"""
+
+import argparse
+import concurrent.futures
+import datetime
+import os
+import subprocess
+import shutil
+import sys
+import tempfile
+import time
+
+
+TOPDIR = os.path.dirname(os.path.realpath(__file__))
+
+
+class Task:
+    """A metrics tool: the directory it runs in, its command line, and the
+    output file it writes (passed as {out}) or, if stdout is set, the file
+    its standard output goes to"""
+
+    def __init__(self, name, cwd, argv, outfile, stdout=False):
+        self.name = name
+        self.cwd = os.path.join(TOPDIR, cwd)
+        self.argv = argv
+        self.outfile = outfile
+        self.stdout = stdout
+
+
+def nightly_tasks(start_date, end_date):
+    return [
+        Task("campuses-with-active-researchers", "campuses-with-active-researchers",
+             ["./campuses-with-active-researchers.py", "--csv", start_date, end_date],
+             "campuses-with-active-researchers.csv", stdout=True),
+        Task("campus-contributions", "campus-contributions",
+             ["./campus-contributions", "--json", start_date, end_date],
+             "campus-contributions.json", stdout=True),
+        Task("osg-cpu-hours", "osg-cpu-hours",
+             ["./osg-cpu-hours.py", "-o", "{out}"],
+             "osg-cpu-hours.json"),
+        Task("calculate-waittime", "osg-project-waittime",
+             ["./calculate-waittime.py", "{out}", start_date, end_date],
+             "osg-waittime.csv"),
+        Task("due-date-changes", "software",
+             ["./due-date-changes.py", "-o", "{out}"],
+             "software-due-date-changes.csv"),
+        Task("connect-origin-users", "connect-origin-users",
+             ["./connect-origin-users.py", "-o", "{out}"],
+             "connect-origin-users.json"),
+    ]
+
+
+def log(msg):
+    print("[%s] %s" % (datetime.datetime.now().strftime("%H:%M:%S"), msg),
+          file=sys.stderr, flush=True)
+
+
+def run_once(task, outdir, timeout, logfile):
+    """Run task, returning its exit status (None if it timed out)"""
+    outpath = os.path.join(outdir, task.outfile)
+    tmppath = outpath + ".tmp"
+    argv = [arg.replace("{out}", tmppath) for arg in task.argv]
+    stdout = open(tmppath, "wb") if task.stdout else logfile
+    try:
+        ret = subprocess.run(argv, cwd=task.cwd, stdout=stdout,
+                             stderr=logfile, timeout=timeout).returncode
+    except subprocess.TimeoutExpired:
+        ret = None
+    finally:
+        if task.stdout:
+            stdout.close()
+    if ret == 0:
+        os.replace(tmppath, outpath)
+    elif os.path.exists(tmppath):
+        os.remove(tmppath)
+    return ret
+
+
+def run_task(task, outdir, timeout, retries, logfile):
+    """Run task until it succeeds or runs out of retries; return
+    (exit status, number of attempts, wall time in seconds)"""
+    t0 = time.time()
+    for attempt in range(1, retries + 2):
+        log("%s: starting (attempt %d)" % (task.name, attempt))
+        logfile.write(b"--- attempt %d\n" % attempt)
+        logfile.flush()
+        ret = run_once(task, outdir, timeout, logfile)
+        if ret == 0:
+            break
+        log("%s: %s" % (task.name, "timed out after %ds" % timeout
+                        if ret is None else "exited with status %d" % ret))
+    log("%s: done" % task.name)
+    return ret, attempt, time.time() - t0
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__,
+                formatter_class=argparse.RawDescriptionHelpFormatter)
+    today = datetime.date.today()
+    parser.add_argument("--start-date",
+        default=(today - datetime.timedelta(days=30)).isoformat(),
+        help="First day of the date range (default: 30 days ago)")
+    parser.add_argument("--end-date",
+        default=(today - datetime.timedelta(days=1)).isoformat(),
+        help="Last day of the date range (default: yesterday)")
+    parser.add_argument("--outdir", default=TOPDIR,
+        help="Where to write the output files (default: %(default)s)")
+    parser.add_argument("--timeout", type=int, default=3 * 3600,
+        help="Seconds each attempt of a tool may run (default: %(default)s)")
+    parser.add_argument("--retries", type=int, default=1,
+        help="How many times to retry a failed tool (default: %(default)s)")
+    parser.add_argument("--jobs", type=int, default=None,
+        help="How many tools to run at once (default: all of them)")
+    parser.add_argument("tasks", nargs="*", metavar="TASK",
+        help="Only run these tools")
+    args = parser.parse_args(argv[1:])
+
+    tasks = nightly_tasks(args.start_date, args.end_date)
+    if args.tasks:
+        unknown = set(args.tasks) - {task.name for task in tasks}
+        if unknown:
+            parser.error("Unknown tasks: %s" % ", ".join(sorted(unknown)))
+        tasks = [task for task in tasks if task.name in args.tasks]
+
+    outdir = os.path.abspath(args.outdir)
+    os.makedirs(outdir, exist_ok=True)
+    logfiles = [tempfile.TemporaryFile() for task in tasks]
+    t0 = time.time()
+    with concurrent.futures.ThreadPoolExecutor(args.jobs or len(tasks)) as pool:
+        futures = [pool.submit(run_task, task, outdir, args.timeout, args.retries, logfile)
+                   for task, logfile in zip(tasks, logfiles)]
+        results = [future.result() for future in futures]
+
+    for task, logfile in zip(tasks, logfiles):
+        print("\n===== %s =====" % task.name, file=sys.stderr, flush=True)
+        logfile.seek(0)
+        shutil.copyfileobj(logfile, sys.stderr.buffer)
+        sys.stderr.buffer.flush()
+        logfile.close()
+    print(file=sys.stderr)
+
+    fmt_string = "%-34s%-10s%-10s%s"
+    print(fmt_string % ("Tool", "Status", "Attempts", "Wall time"), file=sys.stderr)
+    for task, (ret, attempts, walltime) in zip(tasks, results):
+        status = "timeout" if ret is None else str(ret)
+        print(fmt_string % (task.name, status, attempts, "%.0fs" % walltime),
+              file=sys.stderr)
+    print("Total wall time: %.0fs" % (time.time() - t0), file=sys.stderr)
+
+    failed = [task.name for task, (ret, _, _) in zip(tasks, results) if ret != 0]
+    if failed:
+        print("Failed: %s" % ", ".join(failed), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
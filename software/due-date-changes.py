@@ -1,13 +1,20 @@
 #!/usr/bin/env python3
 
 import argparse
+import csv
 import json
+import os
 import re
+import sqlite3
 import sys
 import time
 
-from datetime import datetime
-from jira import JIRA
+from datetime import datetime, timedelta
+
+import jirafetch
+
+
+DEFAULT_STORE = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", ".cache", "jira", "due-date-changes.sqlite")
 
 
 def parse_args():
@@ -20,14 +27,187 @@ def parse_args():
     parser.add_argument("-o", 
         help="Output file",
         default=None)
+    parser.add_argument("--store",
+        help=f"Snapshot store of previously seen issues (default: {DEFAULT_STORE})",
+        default=DEFAULT_STORE)
+    parser.add_argument("--full",
+        help="Ignore the snapshot store and re-read every issue from Jira",
+        action="store_true")
+    parser.add_argument("--prune-days",
+        help="Days between the checks for deleted and moved issues, which list every issue of a project (default: %(default)s)",
+        type=int, default=7)
     args = parser.parse_args()
 
     return {
         "projects": args.projects,
-        "output_file": args.o
+        "output_file": args.o,
+        "store": args.store,
+        "full": args.full,
+        "prune_days": args.prune_days
     }
 
 
+class SnapshotStore:
+    """
+    SQLite store of the due date stats of each issue, and of when each project was last
+    read from Jira, so that later runs only need to read the issues updated since then,
+    and last checked for deleted and moved issues.
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS issues (
+                key TEXT PRIMARY KEY,
+                project TEXT NOT NULL,
+                id INTEGER NOT NULL,
+                updated TEXT,
+                assignee TEXT,
+                duedate_original TEXT,
+                duedate_current TEXT,
+                duedate_changes INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS runs (
+                project TEXT PRIMARY KEY,
+                last_run TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS prunes (
+                project TEXT PRIMARY KEY,
+                last_prune TEXT NOT NULL
+            );
+        """)
+
+    def last_run(self, project):
+        row = self.db.execute("SELECT last_run FROM runs WHERE project = ?", (project,)).fetchone()
+        return datetime.fromisoformat(row[0]) if row else None
+
+    def set_last_run(self, project, run_datetime):
+        self.db.execute("INSERT OR REPLACE INTO runs VALUES (?, ?)", (project, run_datetime.isoformat()))
+
+    def last_prune(self, project):
+        row = self.db.execute("SELECT last_prune FROM prunes WHERE project = ?", (project,)).fetchone()
+        return datetime.fromisoformat(row[0]) if row else None
+
+    def set_last_prune(self, project, run_datetime):
+        self.db.execute("INSERT OR REPLACE INTO prunes VALUES (?, ?)", (project, run_datetime.isoformat()))
+
+    def clear(self, project):
+        self.db.execute("DELETE FROM issues WHERE project = ?", (project,))
+        self.db.execute("DELETE FROM runs WHERE project = ?", (project,))
+        self.db.execute("DELETE FROM prunes WHERE project = ?", (project,))
+
+    def put(self, project, issue, stats):
+        self.db.execute("INSERT OR REPLACE INTO issues VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (issue.key, project, int(issue.id), issue.fields.updated, str(issue.fields.assignee), *stats))
+
+    def remove(self, issue):
+        self.db.execute("DELETE FROM issues WHERE key = ?", (issue.key,))
+
+    def prune(self, project, keys):
+        """Remove the issues of project whose keys are not in keys (deleted, or moved to another project)"""
+        keys = set(keys)
+        stale = [(key,) for key, in self.db.execute("SELECT key FROM issues WHERE project = ?", (project,))
+                 if key not in keys]
+        self.db.executemany("DELETE FROM issues WHERE key = ?", stale)
+
+    def rows(self, project):
+        """(key, assignee, original due date, current due date, number of changes), newest issues first"""
+        return self.db.execute("SELECT key, assignee, duedate_original, duedate_current, duedate_changes"
+                               " FROM issues WHERE project = ? ORDER BY id DESC", (project,))
+
+    def commit(self):
+        self.db.commit()
+
+
+def duedate_stats(issue):
+    """Return the (original due date, current due date, number of due date changes) of an issue"""
+    duedate_current = issue.fields.duedate
+    duedate_original = issue.fields.duedate
+    duedate_changes = 0
+    issue_changelog = issue.changelog.histories
+    # Iterate over the changelog in reverse so we get the oldest changes first
+    for change in reversed(issue_changelog):
+        for item in change.items:
+            if item.field == "duedate":
+                if duedate_changes == 0:
+                    duedate_original = getattr(item, "from")
+                duedate_changes += 1
+                duedate_current = item.to
+    return duedate_original, duedate_current, duedate_changes
+
+
+def update_project(jira, store, project, full, prune_days):
+    """
+    Merge the issues of project that changed since the last run (or with full,
+    every issue) into the store, yielding the (issue, stats) of each issue as
+    it is stored.  Issues deleted or moved from project are dropped from the
+    store at most every prune_days days, since that lists every issue.
+    """
+    run_datetime = datetime.utcnow()
+    last_run = None if full else store.last_run(project)
+    if last_run is None:
+        # First run (or --full): read every issue that is not in To Do
+        store.clear(project)
+        jql = f"project = {project} AND statusCategory != \"To Do\" ORDER BY key DESC"
+    else:
+        # Only the issues updated since the last run, including any that went back to To Do.
+        # Go back an extra day so that the Jira server's time zone cannot make us miss any.
+        since = (last_run - timedelta(days=1)).strftime("%Y-%m-%d %H:%M")
+        jql = f"project = {project} AND updated >= \"{since}\""
+
+    issues = jirafetch.iter_issues(jira, jql, fields="assignee,duedate,status,updated", expand="changelog")
+    for issue in issues:
+        if issue.fields.status.statusCategory.name == "To Do":
+            store.remove(issue)
+        else:
+            stats = duedate_stats(issue)
+            store.put(project, issue, stats)
+            yield issue, stats
+
+    last_prune = store.last_prune(project)
+    if last_run is None:
+        # A full read leaves no deleted or moved issues behind
+        store.set_last_prune(project, run_datetime)
+    elif last_prune is None or run_datetime - last_prune >= timedelta(days=prune_days):
+        # Deleted and moved issues do not show up as updated, so drop every stored
+        # issue that the project no longer has
+        current = jirafetch.iter_issues(jira, f"project = {project} AND statusCategory != \"To Do\"", fields="key")
+        store.prune(project, (issue.key for issue in current))
+        store.set_last_prune(project, run_datetime)
+    store.set_last_run(project, run_datetime)
+    store.commit()
+
+
+def report_rows(jira, store, projects, full, prune_days):
+    """
+    Yield the CSV rows of each project.  When every issue is read from Jira, each
+    row is yielded as soon as its issue is stored; otherwise the (few) changed
+    issues are merged into the store first, and the rows then come from there.
+    """
+    for project in projects:
+        read_all = full or store.last_run(project) is None
+        for issue, stats in update_project(jira, store, project, read_all, prune_days):
+            if read_all:
+                yield format_row(issue.key, str(issue.fields.assignee), *stats)
+        if not read_all:
+            for row in store.rows(project):
+                yield format_row(*row)
+
+
+def format_row(key, assignee, duedate_original, duedate_current, duedate_changes):
+    # Keep printing missing due dates as "None" like before
+    return key, assignee, str(duedate_original), str(duedate_current), duedate_changes
+
+
+def write_report(file, rows):
+    writer = csv.writer(file, lineterminator="\n")
+    writer.writerow(("Issue key", "Assignee", "Original Due Date", "Current Due Date", "Number of Due Date Changes"))
+    for row in rows:
+        writer.writerow(row)
+        file.flush()
+
+
 def main():
 
     args = parse_args()
@@ -35,37 +215,18 @@ def main():
     output_file = args["output_file"]
 
     # Connect to Jira
-    options = {"server": "https://opensciencegrid.atlassian.net"}
-    jira = JIRA(options)
-
-    # Output CSV headers
-    output_data = "Issue key,Assignee,Original Due Date,Current Due Date,Number of Due Date Changes\n"
-
-    # Now iterate over the projects and list their issues
-    for project in projects.split(","):
-        issues = jira.search_issues(f"project = {project} AND statusCategory != \"To Do\"", expand="changelog", maxResults=False)
-        for issue in issues:
-            duedate_current = issue.fields.duedate
-            duedate_original = issue.fields.duedate
-            duedate_changes = 0
-            issue_changelog = issue.changelog.histories
-            # Iterate over the changelog in reverse so we get the oldest changes first
-            for change in reversed(issue_changelog):
-                for item in change.items:
-                    if item.field == "duedate":
-                        if duedate_changes == 0:
-                            duedate_original = getattr(item, "from")
-                        duedate_changes += 1
-                        duedate_current = item.to
-            output_data += f"{issue.key},{issue.fields.assignee},{duedate_original},{duedate_current},{duedate_changes}\n"
+    jira = jirafetch.connect()
+    store = SnapshotStore(args["store"])
+
+    # Now iterate over the projects and write their issues as they come
+    rows = report_rows(jira, store, projects.split(","), args["full"], args["prune_days"])
 
     # Write results to output_file (or stdout is no output file defined)
     if output_file is None:
-        sys.stdout.write(output_data)
+        write_report(sys.stdout, rows)
     else:
-        file = open(output_file, "w")
-        file.write(output_data)
-        file.close()
+        with open(output_file, "w", newline="") as file:
+            write_report(file, rows)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+# Shared Jira access for the software metrics scripts: per-issue requests
+# (worklogs, comments, ...) are run through a bounded thread pool, with
+# retries on rate limiting and server errors, and the results are returned
+# in the same order as the issues.
+
+import concurrent.futures
+import functools
+import random
+import sys
+import threading
+import time
+
+from jira import JIRA
+from jira.exceptions import JIRAError
+
+
+JIRA_SERVER = "https://opensciencegrid.atlassian.net"
+
+DEFAULT_WORKERS = 8
+MAX_RETRIES = 5
+RETRY_ON_STATUS = (429, 500, 502, 503, 504)
+
+# When Jira rate limits one request, all workers wait until this time
+_resume_at = 0.0
+_resume_lock = threading.Lock()
+
+
+def connect():
+    options = {"server": JIRA_SERVER}
+    return JIRA(options)
+
+
+def _wait_for_rate_limit():
+    delay = _resume_at - time.time()
+    if delay > 0:
+        time.sleep(delay)
+
+
+def _back_off(err, attempt):
+    global _resume_at
+    delay = min(60, 2 ** attempt) * random.uniform(0.5, 1.0)
+    response = getattr(err, "response", None)
+    retry_after = response is not None and response.headers.get("Retry-After")
+    if retry_after:
+        try:
+            delay = max(delay, float(retry_after))
+        except ValueError:
+            pass
+    with _resume_lock:
+        _resume_at = max(_resume_at, time.time() + delay)
+    print(f"Jira request failed (HTTP {err.status_code}), retrying in {round(delay, 1)}s",
+          file=sys.stderr)
+
+
+def call_with_retry(func, *args):
+    """Call func(*args), retrying on Jira rate limiting and server errors"""
+    attempt = 0
+    while True:
+        _wait_for_rate_limit()
+        try:
+            return func(*args)
+        except JIRAError as err:
+            if attempt >= MAX_RETRIES or err.status_code not in RETRY_ON_STATUS:
+                raise
+            _back_off(err, attempt)
+            attempt += 1
+
+
+def iter_issues(jira, jql, fields=None, expand=None, page_size=100):
+    """Yield the issues matching jql, one page of search results at a time.
+    fields is a comma-separated list of the fields to return (default all)."""
+    start = 0
+    while True:
+        search = functools.partial(jira.search_issues, jql, startAt=start,
+                                   maxResults=page_size, fields=fields or "*all",
+                                   expand=expand)
+        page = call_with_retry(search)
+        yield from page
+        start += len(page)
+        if len(page) == 0 or start >= page.total:
+            return
+
+
+def fetch_each(func, items, workers=DEFAULT_WORKERS):
+    """Return [func(item) for item in items], running up to `workers` calls at once"""
+    items = list(items)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(lambda item: call_with_retry(func, item), items))
+
+
+def worklogs(jira, issues, workers=DEFAULT_WORKERS):
+    """Return a dict of issue key -> worklogs for each of issues"""
+    issues = list(issues)
+    return dict(zip((issue.key for issue in issues),
+                    fetch_each(jira.worklogs, issues, workers)))
+
+
+def comments(jira, issues, workers=DEFAULT_WORKERS):
+    """Return a dict of issue key -> comments for each of issues"""
+    issues = list(issues)
+    return dict(zip((issue.key for issue in issues),
+                    fetch_each(jira.comments, issues, workers)))
@@ -6,8 +6,9 @@ import re
 import sys
 import time
 
-from datetime import datetime
-from jira import JIRA
+from datetime import datetime, timedelta
+
+import jirafetch
 
 
 def dump(obj):
@@ -80,8 +81,7 @@ def main():
     num_done_issues_code_reviewed = 0
 
     # Connect to Jira
-    options = {"server": "https://opensciencegrid.atlassian.net"}
-    jira = JIRA(options)
+    jira = jirafetch.connect()
 
     # We need to find the key of the "Development" field, to determine if an issue has commits
     development_field_key = None
@@ -90,8 +90,17 @@ def main():
     if "Development" in name_map:
         development_field_key = name_map["Development"]
 
-    # Iterate over all completed issues in the HTCONDOR project
-    issues = jira.search_issues("project = HTCONDOR AND type in (Improvement, Bug) AND status = Done", expand="changelog", maxResults=False)
+    # Iterate over all completed issues in the HTCONDOR project, collecting
+    # those that were marked Done between the provided start and end dates
+    done_issues = []
+    # Only issues that were set to Done during the time period (the dates in JQL have day
+    # resolution, so the exact start and end times are still checked below)
+    done_during = f"status changed to Done during (\"{start_datetime.strftime('%Y-%m-%d')}\", \"{(end_datetime + timedelta(days=1)).strftime('%Y-%m-%d')}\")"
+    issue_fields = "summary"
+    if development_field_key:
+        issue_fields += f",{development_field_key}"
+    issues = jirafetch.iter_issues(jira, f"project = HTCONDOR AND type in (Improvement, Bug) AND status = Done AND {done_during}",
+                                   fields=issue_fields, expand="changelog")
     for issue in issues:
         issue_changelog = issue.changelog.histories
         issue_isdone = False
@@ -111,19 +120,24 @@ def main():
                     # Was this issue set to Done status between the provided end and start dates?
                     changed_datetime = datetime.strptime(changed, "%Y-%m-%dT%H:%M:%S.%f")
                     if changed_datetime > start_datetime and changed_datetime < end_datetime:
-                        if detailed is True:
-                            print(f"{issue.key}: {issue.fields.summary}, Marked Done: {changed_datetime.strftime('%Y-%m-%d %H:%M:%S')}")
-                        num_issues_done += 1
+                        done_issues.append((issue, changed_datetime))
                         issue_isdone = True
-                        # Now check the issue comments for a "code review" text entry
-                        comments = jira.comments(issue)
-                        if len(comments) > 0:
-                            for comment in comments:
-                                if "code review" in comment.body.lower()[0:20]:
-                                    num_done_issues_code_reviewed += 1
-                                    if detailed is True:
-                                        print("\tThis issue was code reviewed")
-                                    break
+
+    # Fetch the comments of the completed issues concurrently
+    issue_comments = jirafetch.comments(jira, [issue for issue, _ in done_issues])
+    for issue, changed_datetime in done_issues:
+        if detailed is True:
+            print(f"{issue.key}: {issue.fields.summary}, Marked Done: {changed_datetime.strftime('%Y-%m-%d %H:%M:%S')}")
+        num_issues_done += 1
+        # Now check the issue comments for a "code review" text entry
+        comments = issue_comments[issue.key]
+        if len(comments) > 0:
+            for comment in comments:
+                if "code review" in comment.body.lower()[0:20]:
+                    num_done_issues_code_reviewed += 1
+                    if detailed is True:
+                        print("\tThis issue was code reviewed")
+                    break
 
     print(f"\nBetween {start_datetime.strftime('%Y-%m-%d')} and {end_datetime.strftime('%Y-%m-%d')}:\n")
     print(f"{num_issues_done} HTCONDOR issues were marked Done")
@@ -5,7 +5,8 @@ import re
 import sys
 
 from datetime import datetime
-from jira import JIRA
+
+import jirafetch
 
 
 def dump(obj):
@@ -88,8 +89,7 @@ def main():
     total_htcss_hours = args["total_htcss_hours"]
 
     # Connect to Jira
-    options = {"server": "https://opensciencegrid.atlassian.net"}
-    jira = JIRA(options)
+    jira = jirafetch.connect()
 
     # Lookup all the members of the htcondor-developers Jira group
     #for member in jira.group_members("htcondor-developers"):
@@ -108,10 +108,21 @@ def main():
         "Tim Theisen": 0
     }
 
-    # Iterate over all Improvement issues
-    issues = jira.search_issues("project = HTCONDOR AND type in (Improvement, Documentation)", maxResults=False)
+    # Iterate over the Improvement issues with work logged during the time period, on the issue
+    # itself or on one of its subtasks.  worklogDate only has day resolution, so the exact
+    # start and end times are still checked below.
+    worklog_dates = f"worklogDate >= \"{start_datetime.strftime('%Y-%m-%d')}\" AND worklogDate <= \"{end_datetime.strftime('%Y-%m-%d')}\""
+    subtasks = jirafetch.iter_issues(jira, f"project = HTCONDOR AND issuetype in subTaskIssueTypes() AND {worklog_dates}", fields="parent")
+    subtask_parents = sorted(set(subtask.fields.parent.key for subtask in subtasks))
+    jql = f"project = HTCONDOR AND type in (Improvement, Documentation) AND ({worklog_dates}"
+    if subtask_parents:
+        jql += f" OR key in ({','.join(subtask_parents)})"
+    jql += ")"
+    issues = list(jirafetch.iter_issues(jira, jql, fields="summary,subtasks"))
+    # Fetch the worklogs of all the issues and their subtasks concurrently, up front
+    issue_worklogs = jirafetch.worklogs(jira, [i for issue in issues for i in [issue, *issue.fields.subtasks]])
     for issue in issues:
-        issue_worklog = jira.worklogs(issue)
+        issue_worklog = issue_worklogs[issue.key]
         display_issue_header = True
         for work_item in issue_worklog:
             work_datetime = work_item.started[0:work_item.started.rfind("-")]
@@ -137,7 +148,7 @@ def main():
         if len(issue_subtasks) > 0 and detailed is True and display_issue_header is True:
             print(f"{issue.key}: {issue.fields.summary}")
         for subtask in issue_subtasks:
-            subtask_worklog = jira.worklogs(subtask)
+            subtask_worklog = issue_worklogs[subtask.key]
             display_subtask_header = True
             for work_item in subtask_worklog:
                 work_datetime = work_item.started[0:work_item.started.rfind("-")]
@@ -0,0 +1,11 @@
+"""Shared access to the OSG Topology resource group summary.
+
+The full rgsummary XML is downloaded at most once per run (and only when it
+has changed since the copy cached on disk), parsed once into a Topology
+model, and shared by every tool that needs facilities, FQDNs, tags or
+services from it.
+
+"""
+
+from .client import TOPOLOGY_HOST, TOPOLOGY_ITB_HOST, get_topology
+from .model import Resource, ResourceGroup, Topology, parse
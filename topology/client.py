@@ -0,0 +1,145 @@
+"""Fetching the Topology rgsummary XML, with an on-disk conditional-GET cache
+
+The unfiltered rgsummary XML is parsed as it is downloaded and saved along
+with its ETag and Last-Modified headers; later downloads send them back, and
+Topology answers 304 Not Modified (with no body) if nothing has changed.  If
+the download fails, the cached copy is used.
+
+    TOPOLOGY_CACHE_DIR  where to keep the XML (default .cache/topology at the
+                        top of the repository)
+    TOPOLOGY_RGSUMMARY_URL
+                        where to get the XML from, with {host} standing for
+                        the Topology host (default https://{host}/rgsummary/xml)
+
+"""
+
+import json
+import os
+import sys
+import threading
+
+import urllib3
+
+from .model import parse
+
+
+TOPOLOGY_HOST = "topology.opensciencegrid.org"
+TOPOLOGY_ITB_HOST = "topology-itb.opensciencegrid.org"
+
+_rgsummary_url = os.environ.get("TOPOLOGY_RGSUMMARY_URL",
+                                "https://{host}/rgsummary/xml")
+
+CACHE_DIR = os.environ.get(
+    "TOPOLOGY_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", ".cache",
+                 "topology"))
+
+_http = urllib3.PoolManager(retries=urllib3.Retry(3, backoff_factor=1))
+_topologies = {}
+_lock = threading.Lock()
+
+
+def _cache_paths(host):
+    base = os.path.join(CACHE_DIR, host)
+    return base + ".xml", base + ".json"
+
+
+class _CachingReader:
+    """File-like wrapper around a streamed HTTP response that saves the data
+    as it is read, replacing the cached copy once the whole body is read"""
+
+    def __init__(self, resp, xmlpath, metapath):
+        self.resp = resp
+        self.xmlpath = xmlpath
+        self.metapath = metapath
+        # per-process temporary names, since the metrics run in parallel
+        self.suffix = ".%d.tmp" % os.getpid()
+        os.makedirs(os.path.dirname(xmlpath), exist_ok=True)
+        self.tmp = open(xmlpath + self.suffix, "wb")
+
+    def read(self, size=-1):
+        data = self.resp.read(size if size >= 0 else None)
+        if data:
+            self.tmp.write(data)
+        elif not self.tmp.closed:
+            self._save()
+        return data
+
+    def finish(self):
+        """Read whatever is left of the body and save it"""
+        while self.read(64 * 1024):
+            pass
+
+    def _save(self):
+        self.tmp.close()
+        with open(self.metapath + self.suffix, "w") as f:
+            json.dump({"etag": self.resp.headers.get("ETag"),
+                       "last_modified": self.resp.headers.get("Last-Modified")},
+                      f)
+        os.replace(self.xmlpath + self.suffix, self.xmlpath)
+        os.replace(self.metapath + self.suffix, self.metapath)
+
+    def close(self):
+        if not self.tmp.closed:
+            self.tmp.close()
+            os.remove(self.xmlpath + self.suffix)
+        self.resp.release_conn()
+
+
+def open_rgsummary(host=TOPOLOGY_HOST):
+    """Return a file-like object for the full rgsummary XML from host: the
+    on-disk copy if Topology says it has not changed, or else the streamed
+    download (which is saved to disk as it is read)"""
+    xmlpath, metapath = _cache_paths(host)
+    try:
+        with open(metapath) as f:
+            meta = json.load(f)
+        cached = open(xmlpath, "rb")
+    except (OSError, ValueError):
+        meta, cached = {}, None
+
+    headers = {}
+    if cached is not None:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    url = _rgsummary_url.format(host=host)
+    try:
+        r = _http.request("GET", url, headers=headers, preload_content=False)
+    except urllib3.exceptions.HTTPError as err:
+        if cached is None:
+            raise
+        print("Could not fetch %s (%s); using cached copy" % (url, err),
+              file=sys.stderr)
+        return cached
+
+    if r.status == 200:
+        if cached is not None:
+            cached.close()
+        return _CachingReader(r, xmlpath, metapath)
+
+    r.release_conn()
+    if r.status == 304 and cached is not None:
+        return cached
+    if cached is None:
+        raise RuntimeError("Could not fetch %s: HTTP %d" % (url, r.status))
+    print("Could not fetch %s (HTTP %d); using cached copy"
+          % (url, r.status), file=sys.stderr)
+    return cached
+
+
+def get_topology(host=TOPOLOGY_HOST):
+    """Return the Topology model for host, fetching and parsing it only
+    once per process"""
+    with _lock:
+        if host not in _topologies:
+            source = open_rgsummary(host)
+            try:
+                _topologies[host] = parse(source)
+                if isinstance(source, _CachingReader):
+                    source.finish()
+            finally:
+                source.close()
+        return _topologies[host]
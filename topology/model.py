@@ -0,0 +1,141 @@
+"""In-memory model of the Topology rgsummary XML
+
+The XML is read with iterparse and each element is cleared once it has been
+turned into a compact Resource record, so the full document tree is never
+held in memory.
+
+"""
+
+import collections
+import io
+import xml.etree.ElementTree as ET
+
+
+PRODUCTION_GRIDTYPE = "OSG Production Resource"
+
+ResourceGroup = collections.namedtuple(
+    "ResourceGroup", ["name", "facility", "site", "production"])
+
+Resource = collections.namedtuple(
+    "Resource", ["name", "fqdn", "active", "disabled", "tags", "services",
+                 "group"])
+
+
+def _text(elem, path):
+    """Return the stripped text at path under elem, or the empty string"""
+    found = elem.find(path)
+    text = getattr(found, "text", None) or ""
+    return text.strip()
+
+
+def _is_true(text):
+    return text.lower() == "true"
+
+
+def _resourcegroup(info):
+    return ResourceGroup(
+        name       = info.get("GroupName", ""),
+        facility   = info.get("Facility", ""),
+        site       = info.get("Site", ""),
+        production = info.get("GridType") == PRODUCTION_GRIDTYPE,
+    )
+
+
+def _resource(r, group):
+    return Resource(
+        name     = _text(r, "Name"),
+        fqdn     = _text(r, "FQDN"),
+        active   = _is_true(_text(r, "Active")),
+        disabled = _is_true(_text(r, "Disable")),
+        tags     = frozenset(_text(t, ".") for t in r.findall("Tags/Tag")),
+        services = frozenset(_text(s, "Name")
+                             for s in r.findall("Services/Service")),
+        group    = group,
+    )
+
+
+class Topology:
+    """The resources in the rgsummary XML, indexed by tag and by service"""
+
+    def __init__(self, resources):
+        self.all_resources = list(resources)
+        self.by_tag = collections.defaultdict(list)
+        self.by_service = collections.defaultdict(list)
+        for r in self.all_resources:
+            for tag in r.tags:
+                self.by_tag[tag].append(r)
+            for service in r.services:
+                self.by_service[service].append(r)
+
+    def resources(self, tag=None, services=None, enabled=False,
+                  production=False):
+        """Return the resources with the given tag and any of the given
+        service names.  With enabled, only active, non-disabled resources;
+        with production, only those in production resource groups."""
+        if tag is not None:
+            found = self.by_tag.get(tag, [])
+        else:
+            found = self.all_resources
+        if services is not None:
+            if isinstance(services, str):
+                services = [services]
+            with_service = set(r for s in services
+                                 for r in self.by_service.get(s, []))
+            found = [r for r in found if r in with_service]
+        if enabled:
+            found = [r for r in found if r.active and not r.disabled]
+        if production:
+            found = [r for r in found if r.group.production]
+        return found
+
+    def facilities(self, **kw):
+        """Return the set of facility names of resources(**kw)"""
+        return set(r.group.facility for r in self.resources(**kw))
+
+    def fqdns(self, **kw):
+        """Return the sorted FQDNs of resources(**kw)"""
+        return sorted(r.fqdn for r in self.resources(**kw))
+
+
+def iter_resources(source):
+    """Yield a Resource for each ResourceGroup/Resources/Resource in the
+    rgsummary XML read from the file-like object source, as it is read"""
+    context = ET.iterparse(source, events=("start", "end"))
+    _, root = next(context)
+    path = []           # tags of the open elements below the root
+    rginfo = {}         # ResourceGroup fields seen so far
+    group = None
+    for event, elem in context:
+        if event == "start":
+            path.append(elem.tag)
+            continue
+        if elem is root:
+            break
+        path.pop()
+        if path == ["ResourceGroup"]:
+            # GroupName, GridType, Facility and Site come before Resources
+            if elem.tag in ("GroupName", "GridType"):
+                rginfo[elem.tag] = _text(elem, ".")
+            elif elem.tag in ("Facility", "Site"):
+                rginfo[elem.tag] = _text(elem, "Name")
+            if elem.tag != "Resources":
+                elem.clear()
+        elif path == ["ResourceGroup", "Resources"] and elem.tag == "Resource":
+            if group is None:
+                group = _resourcegroup(rginfo)
+            yield _resource(elem, group)
+            elem.clear()
+        elif not path and elem.tag == "ResourceGroup":
+            rginfo = {}
+            group = None
+            root.clear()
+
+
+def parse(source):
+    """Parse rgsummary XML (text, bytes, or a file-like object) into a
+    Topology"""
+    if isinstance(source, str):
+        source = source.encode("utf-8")
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    return Topology(iter_resources(source))